@@ -49,15 +49,68 @@ def starting_up():
     return find_process(current_package, suffixes=['wait', 'init'], local_bin=True)
 
 
+def production_server(workers=None, max_requests=0):
+    """
+    Replace the current process with a preforking uWSGI server.
+    The app is created once in the master and then forked (no lazy-apps),
+    connectors are rebuilt in each worker by the post fork hooks.
+    Send SIGHUP to the master for a graceful reload.
+    """
+
+    if workers is None or workers < 1:
+        workers = os.cpu_count() or 1
+
+    args = [
+        'uwsgi',
+        '--master',
+        '--http-socket',
+        '{}:{}'.format(BIND_INTERFACE, os.environ.get('FLASK_PORT')),
+        '--module',
+        '{}.__main__:app'.format(current_package),
+        '--processes',
+        str(workers),
+        '--enable-threads',
+        '--need-app',
+        '--die-on-term',
+        '--vacuum',
+    ]
+
+    if max_requests > 0:
+        # workers are recycled after serving max_requests requests
+        args.extend(['--max-requests', str(max_requests)])
+
+    log.info("Launching {} production workers", workers)
+    os.execvp(args[0], args)
+
+
 @cli.command()
 # @click.option(
 #     '--wait/--no-wait', default=False, help='Wait for startup to finish')
 # def launch(wait):
-def launch():
+@click.option(
+    '--production/--development',
+    default=False,
+    help='Use a preforking WSGI server instead of the development server'
+)
+@click.option(
+    '--workers', default=None, type=int,
+    help='Number of worker processes (production only, default: cpu count)'
+)
+@click.option(
+    '--max-requests', default=0, type=int,
+    help='Recycle a worker after N requests (production only, 0: never)'
+)
+def launch(production, workers, max_requests):
     """Launch the RAPyDo-based HTTP API server"""
 
     mywait()
 
+    if production:
+        if starting_up():
+            log.exit("Please wait few more seconds: resources are still starting up")
+        production_server(workers=workers, max_requests=max_requests)
+        return
+
     args = [
         'run',
         '--host',
@@ -189,6 +242,294 @@ def forced_clean():
     flask_cli({'name': 'Removing data', 'destroy_mode': True})
 
 
+@cli.command('bench-swagger')
+@click.option('--runs', default=5, type=int, help='Number of boots to be timed')
+def bench_swagger(runs):
+    """Time swagger loading with and without skipping the validation"""
+
+    from timeit import default_timer as timer
+    from restapi.customization import Customizer
+    from restapi.utilities.globals import mem
+
+    def load(use_cache):
+        mem.customizer = Customizer()
+        start = timer()
+        mem.customizer.load_swagger(use_cache=use_cache)
+        return timer() - start
+
+    # warm up: imports and cache file
+    load(use_cache=True)
+
+    for use_cache in [False, True]:
+        timings = [load(use_cache) for _ in range(runs)]
+        log.info(
+            "Swagger (cache={}): min {:.3f}s avg {:.3f}s max {:.3f}s",
+            use_cache,
+            min(timings),
+            sum(timings) / len(timings),
+            max(timings),
+        )
+
+
+def benchmark_payload(rows):
+    """ A wrapped list response with rows of mixed types """
+
+    import uuid
+    import decimal
+    from datetime import datetime
+    from restapi.rest.response import ResponseMaker
+
+    now = datetime.now()
+    content = [
+        {
+            'uuid': uuid.uuid4(),
+            'name': 'row {}'.format(i),
+            'created': now,
+            'price': decimal.Decimal('{}.99'.format(i)),
+            'tags': ['a', 'b', 'c'],
+            'active': i % 2 == 0,
+            'count': i,
+        }
+        for i in range(rows)
+    ]
+    return ResponseMaker.wrapped_response(content, code=200)
+
+
+@cli.command('bench-json')
+@click.option('--rows', default=10000, type=int, help='Number of rows in the payload')
+@click.option('--runs', default=5, type=int, help='Number of encodings to be timed')
+def bench_json(rows, runs):
+    """Time the JSON encoders on a large list response"""
+
+    from timeit import default_timer as timer
+    from flask import Flask, json
+    from restapi.rest.encoders import encoders
+
+    envelope = benchmark_payload(rows)
+
+    def time_it(name, dumps):
+        timings = []
+        for _ in range(runs):
+            start = timer()
+            dumps(envelope)
+            timings.append(timer() - start)
+        log.info(
+            "{} ({} rows): min {:.3f}s avg {:.3f}s max {:.3f}s",
+            name,
+            rows,
+            min(timings),
+            sum(timings) / len(timings),
+            max(timings),
+        )
+
+    # Flask jsonify does not support Decimal, as before it has to be converted
+    app = Flask('JSON benchmark')
+    with app.app_context():
+        time_it('flask.json', lambda c: json.dumps(c, default=str))
+
+    for name, dumps in encoders.items():
+        time_it(name, dumps)
+
+
+@cli.command('bench-formats')
+@click.option('--rows', default=10000, type=int, help='Number of rows in the payload')
+@click.option('--runs', default=5, type=int, help='Number of encodings to be timed')
+def bench_formats(rows, runs):
+    """Compare size, encode and decode time of JSON and binary formats"""
+
+    import json
+    from timeit import default_timer as timer
+    from restapi.rest.encoders import dumps, binary_formats
+
+    envelope = benchmark_payload(rows)
+
+    formats = {'application/json': (dumps, json.loads)}
+    formats.update(binary_formats)
+    if len(formats) == 1:
+        log.warning("No binary format available, install msgpack or cbor2")
+
+    for mimetype, (encode, decode) in formats.items():
+        encode_timings = []
+        decode_timings = []
+        for _ in range(runs):
+            start = timer()
+            payload = encode(envelope)
+            encode_timings.append(timer() - start)
+            start = timer()
+            decode(payload)
+            decode_timings.append(timer() - start)
+
+        log.info(
+            "{} ({} rows): {} bytes, encode min {:.3f}s, decode min {:.3f}s",
+            mimetype,
+            rows,
+            len(payload),
+            min(encode_timings),
+            min(decode_timings),
+        )
+
+
+def stub_services():
+    """
+    Replace the connectors of all the available services with stand-ins
+    never reaching the services, e.g. to time the boot in CI.
+    Connector modules and models are still imported
+    """
+
+    from restapi.connectors import Connector
+    from restapi.services.detect import detector
+
+    class StubClient:
+        pass
+
+    class StubConnector(Connector):
+        def custom_connection(self, **kwargs):
+            return StubClient()
+
+    for name, ExtClass in detector.services_classes.items():
+        stub = type(ExtClass.__name__, (StubConnector,), {})
+        stub.set_variables(getattr(ExtClass, 'variables', {}))
+        detector.services_classes[name] = stub
+
+
+def startup_phases(trace_memory=False, stub=False):
+    """ Create the app and print the timing of its boot phases as json """
+
+    import json
+    import tracemalloc
+    from timeit import default_timer as timer
+
+    if trace_memory:
+        tracemalloc.start()
+
+    start = timer()
+    from restapi.server import create_app
+    from restapi.utilities.boot import boot_phases
+
+    phases = {'imports': [timer() - start, None]}
+    if stub:
+        stub_services()
+    create_app(name='Startup benchmark')
+    phases.update(boot_phases)
+
+    peak = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+    phases['total'] = [timer() - start, peak]
+
+    print(json.dumps(phases))
+
+
+@cli.command('bench-startup')
+@click.option('--runs', default=5, type=int, help='Number of cold starts')
+@click.option(
+    '--memory/--no-memory', default=True,
+    help='Also trace allocated memory with tracemalloc (slower boots)'
+)
+@click.option(
+    '--max-seconds', default=None, type=float,
+    help='Fail if the average total boot time exceeds this threshold'
+)
+@click.option(
+    '--stub-services', 'stub', is_flag=True, default=False,
+    help='Boot with stand-in connectors, without reaching the services (e.g. CI)'
+)
+def bench_startup(runs, memory, max_seconds, stub):
+    """Time each boot phase of the app over N cold starts"""
+
+    import sys
+    import json
+    import subprocess
+
+    code = "from {}.__commands__ import startup_phases; startup_phases({}, {})".format(
+        current_package, memory, stub
+    )
+
+    results = {}
+    for i in range(runs):
+        # a new process for each run: nothing is already imported or initialized
+        output = subprocess.run(
+            [sys.executable, '-c', code],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        if output.returncode != 0:
+            log.exit("Startup {}/{} failed", i + 1, runs)
+
+        phases = json.loads(output.stdout.strip().splitlines()[-1])
+        for name, (seconds, memory_delta) in phases.items():
+            results.setdefault(name, []).append((seconds, memory_delta))
+
+    click.echo(
+        "{:<16} {:>10} {:>10} {:>10} {:>12}".format(
+            'phase', 'avg ms', 'min ms', 'max ms', 'memory KiB')
+    )
+    for name, values in results.items():
+        timings = [v[0] * 1000 for v in values]
+        allocated = [v[1] for v in values if v[1] is not None]
+        if allocated:
+            allocated = "{:.0f}".format(sum(allocated) / len(allocated) / 1024)
+        else:
+            allocated = "-"
+        click.echo(
+            "{:<16} {:>10.1f} {:>10.1f} {:>10.1f} {:>12}".format(
+                name,
+                sum(timings) / len(timings),
+                min(timings),
+                max(timings),
+                allocated,
+            )
+        )
+
+    total = results.get('total', [])
+    if max_seconds is not None and total:
+        average = sum(v[0] for v in total) / len(total)
+        if average > max_seconds:
+            log.exit("Boot takes {:.3f}s, above {:.3f}s", average, max_seconds)
+
+
+@cli.command('import-time')
+@click.option('--module', default='restapi.server', help='Module to be imported')
+@click.option('--top', default=20, type=int, help='Number of packages to show')
+def import_time(module, top):
+    """Profile imports time (python -X importtime) grouped by package"""
+
+    import sys
+    import subprocess
+
+    command = [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)]
+    output = subprocess.run(command, stderr=subprocess.PIPE, universal_newlines=True)
+
+    packages = {}
+    total = 0
+    for line in output.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        # import time: self [us] | cumulative | imported package
+        pieces = line[len('import time:'):].split('|')
+        if len(pieces) != 3:
+            continue
+        try:
+            self_time = int(pieces[0])
+        except ValueError:
+            # header line
+            continue
+        package = pieces[2].strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + self_time
+        total += self_time
+
+    if output.returncode != 0:
+        log.warning("Import of {} failed, partial results", module)
+
+    click.echo("{:>10} {:>6}  {}".format('ms', '%', 'package'))
+    ranking = sorted(packages.items(), key=lambda p: p[1], reverse=True)
+    for package, t in ranking[:top]:
+        click.echo(
+            "{:>10.1f} {:>6.1f}  {}".format(t / 1000, 100 * t / max(total, 1), package)
+        )
+    click.echo("{:>10.1f} {:>6}  {}".format(total / 1000, '', 'TOTAL'))
+
+
 @cli.command()
 @click.option('--wait/--no-wait', default=False, help='Wait for startup to finish')
 @click.option(
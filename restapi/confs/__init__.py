@@ -2,10 +2,9 @@
 
 import os
 import re
+import tempfile
 from urllib.parse import urlparse
 
-from glom import glom
-
 from restapi.utilities.globals import mem
 
 STACKTRACE = False
@@ -30,6 +29,13 @@ SECRET_KEY_FILE = os.environ.get('JWT_APP_SECRETS') + "/secret.key"
 #################
 PRODUCTION = os.environ.get('APP_MODE', '') == 'production'
 
+# Files computed at boot time and reused by the following boots/processes,
+# by default in a folder of the current user (see utilities.cache)
+CACHE_PATH = os.environ.get(
+    'RESTAPI_CACHE_PATH',
+    os.path.join(tempfile.gettempdir(), 'restapi_cache-{}'.format(os.getuid())),
+)
+
 MODELS_DIR = 'models'
 CONF_PATH = 'confs'
 # Also configured in controller
@@ -54,7 +60,8 @@ ABS_RESTAPI_PATH = os.path.dirname(ABS_RESTAPI_CONFSPATH)
 
 
 def get_project_configuration(key, default=None):
-    return glom(mem.customizer._configurations, key, default=default)
+    # O(1) lookup on the read-only snapshot built once by the Customizer
+    return mem.customizer._snapshot.get(key, default)
 
 
 def get_api_url(request_object, production=False):
@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 
 import abc
+import time
+import threading
 from datetime import datetime, timedelta
+from timeit import default_timer as timer
 
 from flask import _app_ctx_stack as stack
 from restapi.utilities.meta import Meta
 from restapi.utilities.logs import log
+from restapi.utilities.metrics import metrics
 
 
 class Connector(metaclass=abc.ABCMeta):
@@ -18,6 +22,7 @@ class Connector(metaclass=abc.ABCMeta):
         self.objs = {}
         self.set_name()
         self.args = kwargs
+        self._keepalive_thread = None
 
         self.app = app
         if app is not None:
@@ -108,6 +113,25 @@ class Connector(metaclass=abc.ABCMeta):
         self.post_connection(obj, **kwargs)
 
         obj.connection_time = datetime.now()
+        # saved to let the keepalive rebuild the very same connection
+        obj.connection_kwargs = kwargs
+        return obj
+
+    def reconnect(self, **kwargs):
+        """
+        A single connection attempt, as connect without retries:
+        the exceptions of custom_connection are raised to the caller
+        """
+
+        if not self.pre_connection(**kwargs):
+            log.warning("Unable to make preconnection for {}", self.name)
+            return None
+
+        obj = self.custom_connection(**kwargs)
+        self.post_connection(obj, **kwargs)
+
+        obj.connection_time = datetime.now()
+        obj.connection_kwargs = kwargs
         return obj
 
     def set_models_to_service(self, obj):
@@ -160,6 +184,108 @@ class Connector(metaclass=abc.ABCMeta):
         if self.get_object(ref=ctx) is not None:
             self.close_connection(ctx)
 
+    def get_keepalive_interval(self):
+        """ Seconds between health checks, from <PREFIX>_KEEPALIVE (0 = off) """
+
+        variables = getattr(self, 'variables', None) or {}
+        try:
+            return int(variables.get('keepalive', 0))
+        except (TypeError, ValueError):
+            log.warning("Invalid keepalive interval for {}", self.name)
+            return 0
+
+    def start_keepalive(self):
+        """
+        Start (once per process) a daemon thread checking the connections
+        cached by this connector and recycling the dead ones, so that
+        requests never pay for the reconnection
+        """
+
+        if self._keepalive_thread is not None and self._keepalive_thread.is_alive():
+            return self._keepalive_thread
+
+        interval = self.get_keepalive_interval()
+        if interval <= 0:
+            return None
+
+        self._keepalive_thread = threading.Thread(
+            target=self.keepalive,
+            args=(interval,),
+            name="keepalive-{}".format(self.name),
+            daemon=True,
+        )
+        self._keepalive_thread.start()
+        log.verbose("Keepalive started for {} (every {}s)", self.name, interval)
+        return self._keepalive_thread
+
+    def keepalive(self, interval):
+
+        while True:
+            time.sleep(interval)
+            self.check_connections()
+
+    def check_connections(self):
+        """ Verify every cached connection and replace the dead ones """
+
+        # the exceptions signaling that the service is not (yet) available
+        exceptions = self.set_connection_exception() or ()
+
+        for h, obj in list(self.objs.items()):
+            if obj is None:
+                continue
+
+            try:
+                alive = self.is_connected(obj)
+            except BaseException as e:
+                log.warning("Health check failed for {}: {}", self.name, e)
+                alive = False
+
+            if alive:
+                continue
+
+            log.warning("Connection lost for {}, reconnecting", self.name)
+            # connect would retry (and exit) when no parameters are given
+            try:
+                new_obj = self.reconnect(**getattr(obj, 'connection_kwargs', {}))
+            except exceptions as e:
+                log.warning("Unable to reconnect {}, retrying later: {}", self.name, e)
+                continue
+            except Exception as e:
+                log.error("Unable to reconnect {}: {}", self.name, e)
+                continue
+
+            if new_obj is not None:
+                self.objs[h] = new_obj
+
+    def post_fork(self):
+        """
+        Called in a child process just after the fork: connections inherited
+        from the parent (sockets, pools, drivers) are not safe to be shared.
+        This runs for every fork of the process (e.g. multiprocessing too),
+        so nothing here can block: objects that cannot be reset in place
+        by rebuild_connection are stale and dropped, get_instance will
+        connect again at their first use
+        """
+
+        # threads are not inherited by the child, start a new one if needed
+        self._keepalive_thread = None
+
+        for h, obj in list(self.objs.items()):
+            if obj is None:
+                continue
+            try:
+                obj = self.rebuild_connection(obj)
+            except BaseException as e:
+                log.error("Unable to rebuild {} after fork: {}", self.name, e)
+                obj = None
+
+            if obj is None:
+                self.objs.pop(h, None)
+            else:
+                self.objs[h] = obj
+
+        log.verbose("Connections reset for {}", self.name)
+
     def get_instance(self, **kwargs):
 
         # Parameters
@@ -169,17 +295,23 @@ class Connector(metaclass=abc.ABCMeta):
         # pinit = kwargs('project_initialization', False)
 
         # Variables
+        start = timer()
         obj = None
         ctx = stack.top
         ref = self
         unique_hash = str(sorted(kwargs.items()))
 
+        self.start_keepalive()
+
         # When not using the context, this is the first connection
         if ctx is None:
             # First connection, before any request
             obj = self.connect()
             if obj is None:
                 return None
+            metrics.inc(
+                'restapi_connector_connections_total', (('connector', self.name),)
+            )
             # self.initialization(obj=obj)
             self.set_object(obj=obj, ref=ref)
 
@@ -207,12 +339,18 @@ class Connector(metaclass=abc.ABCMeta):
                 obj = self.connect(**kwargs)
                 if obj is None:
                     return None
+                metrics.inc(
+                    'restapi_connector_connections_total', (('connector', self.name),)
+                )
                 self.set_object(obj=obj, ref=ref, key=unique_hash)
             else:
                 pass
 
         obj = self.set_models_to_service(obj)
 
+        metrics.observe(
+            'restapi_connector_seconds', (('connector', self.name),), timer() - start
+        )
         return obj
 
     ############################
@@ -225,6 +363,17 @@ class Connector(metaclass=abc.ABCMeta):
     def post_connection(self, obj=None, **kwargs):
         return True
 
+    def rebuild_connection(self, obj):
+        """ override this method if obj can be reused after a fork
+        by resetting its native connections, without blocking (no I/O).
+        None: obj is stale, a new connection is made at next get_instance"""
+        return None
+
+    def is_connected(self, obj):
+        """ override this method to verify that obj is still usable,
+        it is periodically called by the keepalive thread"""
+        return True
+
     def close_connection(self, ctx):
         """ override this method if you must close
         your connection after each request"""
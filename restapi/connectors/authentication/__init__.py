@@ -72,6 +72,10 @@ class Authenticator(Connector):
 
         return custom_auth
 
+    def rebuild_connection(self, obj):
+        # No native connection here, the backend is rebuilt by its own connector
+        return obj
+
     def custom_init(self, pinit=False, pdestroy=False, abackend=None, **kwargs):
 
         # Get the instance from the parent
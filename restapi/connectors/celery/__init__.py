@@ -226,6 +226,10 @@ class CeleryExt(Connector):
 
         return celery_app
 
+    def rebuild_connection(self, obj):
+        # Celery already resets its broker pools after forks
+        return obj
+
     @classmethod
     def get_periodic_task(cls, name):
 
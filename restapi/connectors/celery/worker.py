@@ -9,17 +9,50 @@ Of course that discussion is not enough for
 a flask templating framework like ours.
 So we made some improvement along the code.
 
+Tasks do not need the full server (endpoints, swagger, CORS, GeoIP, SMTP...):
+here the app only loads the configuration and the connectors used by tasks,
+listed in CELERY_WORKER_SERVICES (comma separated, default: all services).
+The backend of the authentication is enabled with it, when not listed
+
 """
 
-from restapi.server import create_app
+import os
+import time
+import psutil
+from flask import Flask
+
+from restapi import confs as config
 from restapi.confs import CUSTOM_PACKAGE
+from restapi.customization import Customizer
+from restapi.services.detect import detector
+from restapi.utilities.globals import mem
 from restapi.utilities.meta import Meta
-from restapi.utilities.logs import log
+from restapi.utilities.logs import log, init_sentry
 
 ################################################
 # Reload Flask app code also for the worker
 # This is necessary to have the app context available
-app = create_app(worker_mode=True)
+# app = create_app(worker_mode=True)
+mem.customizer = Customizer()
+
+app = Flask("worker")
+app.config.from_object(config)
+
+services = detector.output_service_variables('celery').get('worker_services')
+if services is not None and services.strip() != '':
+    services = [s.strip() for s in services.split(',')]
+    # the tasks queue is always required
+    services.append(detector.task_service_name)
+else:
+    services = None
+
+app.connectors = detector.init_services(
+    app=app, worker_mode=True, project_init=False, project_clean=False,
+    services=services,
+)
+
+# Connections are rebuilt in the children of the prefork pool
+detector.register_fork_hooks(app)
 
 celery_app = app.connectors.get('celery').celery_app
 celery_app.app = app
@@ -45,4 +78,12 @@ meta = Meta()
 # # Custom tasks
 submodules = meta.import_submodules_from_package("{}.tasks".format(CUSTOM_PACKAGE))
 
+init_sentry(celery=True)
+
+process = psutil.Process(os.getpid())
+log.info(
+    "Celery worker is ready in {:.3f}s using {:.1f} MB",
+    time.time() - process.create_time(),
+    process.memory_info().rss / 1024 / 1024,
+)
 log.debug("Celery worker is ready {}", celery_app)
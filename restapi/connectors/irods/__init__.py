@@ -9,9 +9,11 @@ import logging
 
 # from irods.session import iRODSSession
 from irods import exception as iexceptions
+from irods.connection import Connection
 
 # from restapi.confs import PRODUCTION
 from restapi.utilities.logs import log
+from restapi.utilities.queries import count_query
 from restapi.connectors import Connector
 from restapi.connectors.irods.session import iRODSPickleSession as iRODSSession
 from restapi.connectors.irods.client import IrodsException, IrodsPythonClient
@@ -21,6 +23,20 @@ from restapi.connectors.irods.certificates import Certificates
 irodslogger = logging.getLogger('irods')
 irodslogger.setLevel(logging.INFO)
 
+
+def counted_send(send):
+    """ Count API requests sent by any iRODS connection """
+
+    def wrapper(self, message):
+        if message.msg_type == 'RODS_API_REQ':
+            count_query('irods', 'API {}'.format(message.int_info))
+        return send(self, message)
+
+    return wrapper
+
+
+Connection.send = counted_send(Connection.send)
+
 NORMAL_AUTH_SCHEME = 'credentials'
 GSI_AUTH_SCHEME = 'GSI'
 PAM_AUTH_SCHEME = 'PAM'
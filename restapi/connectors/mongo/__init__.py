@@ -1,12 +1,32 @@
 # -*- coding: utf-8 -*-
 
 import pymodm.connection as mongodb
+from pymongo import monitoring
 from restapi.utilities.logs import log
+from restapi.utilities.queries import count_query
 from restapi.connectors import Connector
 
 AUTH_DB = 'auth'
 
 
+class QueriesCounter(monitoring.CommandListener):
+    """ Started events are published by the thread executing the command """
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        count_query('mongo', '{} {}'.format(event.command_name, collection))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Only applied to clients created after the registration
+monitoring.register(QueriesCounter())
+
+
 class MongoExt(Connector):
 
     # _defaultdb = 'test'
@@ -46,6 +66,11 @@ class MongoExt(Connector):
 
         return obj
 
+    def is_connected(self, obj):
+
+        obj.connection.database.client.admin.command('ping')
+        return True
+
     def custom_init(self, pinit=False, pdestroy=False, abackend=None, **kwargs):
         """ Note: we ignore args here """
 
@@ -7,6 +7,19 @@ from functools import wraps
 from neomodel import db, config
 from restapi.connectors import Connector
 from restapi.utilities.logs import log
+from restapi.utilities.queries import count_query
+
+
+def counted_cypher_query(cypher_query):
+    """ Wrap db.cypher_query, used by both neomodel and NeomodelClient """
+
+    @wraps(cypher_query)
+    def wrapper(query, *args, **kwargs):
+        count_query('neo4j', query)
+        return cypher_query(query, *args, **kwargs)
+
+    wrapper.counted = True
+    return wrapper
 
 
 class NeomodelClient:
@@ -114,12 +127,25 @@ class NeoModel(Connector):
         config.FORCE_TIMEZONE = True  # default False
         db.url = self.uri
         db.set_connection(self.uri)
+        if not getattr(db.cypher_query, 'counted', False):
+            db.cypher_query = counted_cypher_query(db.cypher_query)
 
         client = NeomodelClient(db)
         return client
 
         # return db
 
+    def rebuild_connection(self, obj):
+
+        # neomodel creates a new driver at the first query made by a new pid,
+        # the inherited one is simply dropped
+        return obj
+
+    def is_connected(self, obj):
+
+        obj.cypher("RETURN 1")
+        return True
+
     def custom_init(self, pinit=False, pdestroy=False, abackend=None, **kwargs):
         """ Note: we ignore args here """
 
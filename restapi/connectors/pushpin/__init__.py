@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import urllib.request
+import urllib.error
+
 from gripcontrol import GripPubControl
 from gripcontrol import WebSocketMessageFormat
 from pubcontrol import Item
@@ -8,6 +11,10 @@ from restapi.utilities.logs import log
 from restapi.connectors import Connector
 
 
+# Seconds to wait for the control server when verifying the connection
+PROBE_TIMEOUT = 5
+
+
 class ServiceUnavailable(BaseException):
     pass
 
@@ -32,20 +39,40 @@ class PushpinExt(Connector):
             'control_uri': control_uri
         })
 
-        client = PushpinClient(pubctrl)
+        client = PushpinClient(pubctrl, control_uri)
 
-        is_active = client.publish_on_stream('admin', 'Connection test', sync=True)
-
-        if is_active:
+        if client.probe():
             return client
 
         raise ServiceUnavailable("Pushpin unavailable on {}".format(control_uri))
 
+    def is_connected(self, obj):
+
+        return obj.probe()
+
 
 class PushpinClient:
 
-    def __init__(self, pub):
+    def __init__(self, pub, control_uri=None):
         self.pub = pub
+        self.control_uri = control_uri
+
+    def probe(self, timeout=PROBE_TIMEOUT):
+        """
+        Verify that the control server is reachable, without publishing:
+        any HTTP response is fine (GET is not allowed on the publish endpoint)
+        """
+
+        try:
+            urllib.request.urlopen(
+                "{}/publish/".format(self.control_uri), timeout=timeout
+            ).close()
+        except urllib.error.HTTPError:
+            return True
+        except (OSError, ValueError) as e:
+            log.warning('Pushpin unreachable on {}: {}', self.control_uri, e)
+            return False
+        return True
 
     def callback(self, result, message):
         if result:
@@ -9,11 +9,21 @@ For future lazy alchemy: http://flask.pocoo.org/snippets/22/
 """
 
 import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from restapi.utilities.meta import Meta
 from restapi.confs import EXTENDED_PROJECT_DISABLED, BACKEND_PACKAGE
 from restapi.confs import CUSTOM_PACKAGE, EXTENDED_PACKAGE
 from restapi.connectors import Connector
 from restapi.utilities.logs import log
+from restapi.utilities.queries import count_query
+
+
+# Registered on the Engine class to count statements of both our engine_bis
+# and the Flask-SQLAlchemy engine
+@event.listens_for(Engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    count_query('sqlalchemy', statement)
 
 
 class SqlAlchemy(Connector):
@@ -89,6 +99,38 @@ class SqlAlchemy(Connector):
 
         return db
 
+    @staticmethod
+    def reset_pool(engine):
+        """
+        Replace the pool inherited from the parent with an empty one, lazily
+        filled with connections owned by this process. Inherited connections
+        are not closed: closing them would terminate the sessions of the parent
+        """
+        try:
+            # SQLAlchemy >= 1.4.33
+            engine.dispose(close=False)
+        except TypeError:
+            engine.pool = engine.pool.recreate()
+
+    def rebuild_connection(self, obj):
+
+        self.reset_pool(obj.engine_bis)
+        # sessions of the forking thread are dropped, not closed (no rollback)
+        obj.session.registry.clear()
+        try:
+            self.reset_pool(obj.get_engine(self.app))
+        except BaseException as e:
+            log.verbose("Flask-SQLAlchemy engine not reset: {}", e)
+        return obj
+
+    def is_connected(self, obj):
+
+        from sqlalchemy import text
+
+        with obj.engine_bis.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        return True
+
     def custom_init(self, pinit=False, pdestroy=False, abackend=None, **kwargs):
         """ Note: we ignore args here """
 
@@ -6,6 +6,8 @@ Customization based on configuration 'blueprint' files
 
 import os
 import copy
+import json
+import hashlib
 
 from restapi.confs import API_URL, BASE_URLS, ABS_RESTAPI_PATH, CONF_PATH
 from restapi.confs import BACKEND_PACKAGE, CUSTOM_PACKAGE
@@ -13,8 +15,10 @@ from restapi.confs.attributes import EndpointElements, ExtraAttributes
 from restapi.services.detect import detector
 from restapi.swagger import Swagger
 
+from restapi.utilities.cache import read_cache_file, save_cache_file
 from restapi.utilities.meta import Meta
 from restapi.utilities.configuration import read_configuration
+from restapi.utilities.configuration import get_configuration_snapshot
 from restapi.utilities.logs import log
 
 meta = Meta()
@@ -37,6 +41,7 @@ class Customizer:
         self._endpoints = []
         self._definitions = {}
         self._configurations = {}
+        self._snapshot = {}
         self._query_params = {}
         self._schemas_map = {}
 
@@ -58,11 +63,14 @@ class Customizer:
         except AttributeError as e:
             log.exit(e)
 
-    def load_swagger(self):
+        # Read-only flat copy used for fast lookups by get_project_configuration
+        self._snapshot = get_configuration_snapshot(self._configurations)
+
+    def load_swagger(self, use_cache=True):
 
         self.do_schema()
         self.find_endpoints()
-        self.do_swagger()
+        self.do_swagger(use_cache=use_cache)
 
     def do_schema(self):
         """ Schemas exposing, if requested """
@@ -92,10 +100,7 @@ class Customizer:
         # TODO: find a way to publish on swagger the schema
         # if endpoint is enabled to publish and the developer asks for it
 
-    def find_endpoints(self):
-
-        ##################
-        # Walk folders looking for endpoints
+    def get_endpoints_folders(self):
 
         endpoints_folders = []
         # base swagger dir (rapydo/http-ap)
@@ -118,151 +123,266 @@ class Customizer:
             {'path': os.path.join(os.curdir, CUSTOM_PACKAGE), 'iscore': False}
         )
 
-        # already_loaded = {}
         for folder in endpoints_folders:
-
             base_dir = folder.get('path')
-            iscore = folder.get('iscore')
             # get last item of the path
             # normapath is required to strip final / is any
             base_module = os.path.basename(os.path.normpath(base_dir))
 
-            if iscore:
-                apis_dir = os.path.join(base_dir, 'resources')
-                apiclass_module = '{}.resources'.format(base_module)
+            if folder.get('iscore'):
+                folder['apis_dir'] = os.path.join(base_dir, 'resources')
+                folder['apis_module'] = '{}.resources'.format(base_module)
             else:
-                apis_dir = os.path.join(base_dir, 'apis')
-                apiclass_module = '{}.apis'.format(base_module)
+                folder['apis_dir'] = os.path.join(base_dir, 'apis')
+                folder['apis_module'] = '{}.apis'.format(base_module)
 
-            # Looking for all file in apis folder
-            for epfiles in os.listdir(apis_dir):
+        return endpoints_folders
 
-                if not epfiles.endswith(".py"):
+    @staticmethod
+    def get_sources(apis_dir):
+        """ Modification times of all python files in the apis folder """
+
+        sources = {}
+        with os.scandir(apis_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".py"):
+                    sources[entry.name] = entry.stat().st_mtime
+        return sources
+
+    @staticmethod
+    def get_manifest_file(endpoints_folders):
+
+        # endpoints can be conditionally defined based on enabled services
+        key = json.dumps(
+            [[f['apis_dir'] for f in endpoints_folders], detector.available_services],
+            sort_keys=True
+        )
+        checksum = hashlib.sha256(key.encode()).hexdigest()
+        return 'endpoints-{}.json'.format(checksum)
+
+    def read_manifest(self, filename, sources):
+        """ Return the manifest, if still matching the current sources """
+
+        content = read_cache_file(filename)
+        if content is None:
+            return None
+        try:
+            manifest = json.loads(content)
+        except ValueError:
+            return None
+
+        if manifest.get('sources') != sources:
+            log.debug("Endpoints manifest is outdated")
+            return None
+
+        return manifest
+
+    @staticmethod
+    def import_module(module_name):
+        log.debug("Importing {}", module_name)
+        try:
+            return Meta.get_module_from_string(
+                module_name,
+                exit_on_fail=True,
+                exit_if_not_found=True
+            )
+        except BaseException as e:
+            log.exit("Cannot import {}\nError: {}", module_name, e)
+
+    def discover_endpoints(self, folder):
+        """
+        Import every module in the apis folder and
+        describe all classes defining endpoints
+        """
+
+        apis_dir = folder.get('apis_dir')
+        apiclass_module = folder.get('apis_module')
+
+        discovered = []
+        # Looking for all file in apis folder
+        for epfiles in sorted(os.listdir(apis_dir)):
+
+            if not epfiles.endswith(".py"):
+                continue
+
+            # get module name (es: apis.filename)
+            module_file = os.path.splitext(epfiles)[0]
+            module_name = "{}.{}".format(apiclass_module, module_file)
+            # Convert module name into a module
+            module = self.import_module(module_name)
+
+            # Extract classes from the module
+            # classes = meta.get_classes_from_module(module)
+            classes = meta.get_new_classes_from_module(module)
+            for class_name in classes:
+                ep_class = classes.get(class_name)
+                # Filtering out classes without expected data
+                if not hasattr(ep_class, "methods"):
+                    continue
+                if ep_class.methods is None:
                     continue
 
-                # get module name (es: apis.filename)
-                module_file = os.path.splitext(epfiles)[0]
-                module_name = "{}.{}".format(apiclass_module, module_file)
-                # Convert module name into a module
-                log.debug("Importing {}", module_name)
-                try:
-                    module = Meta.get_module_from_string(
-                        module_name,
-                        exit_on_fail=True,
-                        exit_if_not_found=True
-                    )
-                except BaseException as e:
-                    log.exit("Cannot import {}\nError: {}", module_name, e)
-
-                # Extract classes from the module
-                # classes = meta.get_classes_from_module(module)
-                classes = meta.get_new_classes_from_module(module)
-                for class_name in classes:
-                    ep_class = classes.get(class_name)
-                    # Filtering out classes without expected data
-                    if not hasattr(ep_class, "methods"):
-                        continue
-                    if ep_class.methods is None:
+                uris = []
+                for m in ep_class.methods:
+                    conf = getattr(ep_class, "_{}".format(m), None)
+                    if conf is None:
+                        conf = getattr(ep_class, m, {})
+                    uris.extend(conf.keys())
+
+                discovered.append({
+                    'module': module_name,
+                    'class': class_name,
+                    'uris': uris,
+                    'methods': sorted(ep_class.methods),
+                    'depends_on': list(ep_class.depends_on),
+                })
+
+        return discovered
+
+    def unmet_dependency(self, depends_on):
+        """ Return the first unmet dependency, if any """
+
+        for var in depends_on:
+            pieces = var.strip().split(' ')
+            pieces_num = len(pieces)
+            if pieces_num == 1:
+                dependency = pieces.pop()
+                negate = False
+            elif pieces_num == 2:
+                negate, dependency = pieces
+                negate = negate.lower() == 'not'
+            else:
+                log.exit('Wrong parameter: {}', var)
+
+            check = detector.get_bool_from_os(dependency)
+            if negate:
+                check = not check
+
+            # Skip if not meeting the requirements of the dependency
+            if not check:
+                return dependency
+
+        return None
+
+    def find_endpoints(self):
+
+        ##################
+        # Read the endpoints manifest,
+        # folders are walked and modules inspected only if sources changed
+
+        endpoints_folders = self.get_endpoints_folders()
+        sources = {
+            f['apis_dir']: self.get_sources(f['apis_dir']) for f in endpoints_folders
+        }
+
+        manifest_file = self.get_manifest_file(endpoints_folders)
+        manifest = self.read_manifest(manifest_file, sources)
+
+        if manifest is None:
+            manifest = {'sources': sources, 'endpoints': {}}
+            for folder in endpoints_folders:
+                manifest['endpoints'][folder['apis_dir']] = \
+                    self.discover_endpoints(folder)
+            save_cache_file(manifest_file, json.dumps(manifest))
+        else:
+            log.debug("Endpoints loaded from manifest")
+
+        # already_loaded = {}
+        for folder in endpoints_folders:
+
+            apis_dir = folder.get('apis_dir')
+            iscore = folder.get('iscore')
+
+            for description in manifest['endpoints'].get(apis_dir, []):
+
+                module_name = description['module']
+                class_name = description['class']
+
+                if not self._testing:
+                    dependency = self.unmet_dependency(description['depends_on'])
+                    if dependency is not None:
+                        # the module is not even imported
+                        log.debug(
+                            "Skipping '{} {}' due to unmet dependency: {}",
+                            module_name,
+                            class_name,
+                            dependency
+                        )
                         continue
 
-                    log.debug(
-                        "Importing {} from {}.{}", class_name, apis_dir, module_file
+                module = self.import_module(module_name)
+                ep_class = getattr(module, class_name)
+
+                log.debug("Importing {} from {}", class_name, module_name)
+                self.build_endpoint(ep_class, iscore)
+
+    def build_endpoint(self, ep_class, iscore):
+
+        class_name = ep_class.__name__
+
+        # Building endpoint
+        endpoint = EndpointElements(custom={})
+
+        endpoint.cls = ep_class
+        endpoint.exists = True
+        endpoint.iscore = iscore
+
+        # Global tags to be applied to all methods
+        endpoint.tags = ep_class.labels
+
+        # base URI
+        base = ep_class.baseuri
+        if base not in BASE_URLS:
+            log.warning("Invalid base {}", base)
+            base = API_URL
+        base = base.strip('/')
+        endpoint.base_uri = base
+
+        endpoint.uris = {}  # attrs python lib bug?
+        endpoint.custom['schema'] = {
+            'expose': ep_class.expose_schema,
+            'publish': {},
+        }
+
+        endpoint.methods = {}
+
+        mapping_lists = []
+        for m in ep_class.methods:
+            method_name = "_{}".format(m)
+            if not hasattr(ep_class, method_name):
+
+                method_name = m
+                if not hasattr(ep_class, method_name):
+                    log.warning(
+                        "{} configuration not found in {}", m, class_name
                     )
-                    if not self._testing:
-                        skip = False
-                        for var in ep_class.depends_on:
-                            pieces = var.strip().split(' ')
-                            pieces_num = len(pieces)
-                            if pieces_num == 1:
-                                dependency = pieces.pop()
-                                negate = False
-                            elif pieces_num == 2:
-                                negate, dependency = pieces
-                                negate = negate.lower() == 'not'
-                            else:
-                                log.exit('Wrong parameter: {}', var)
-
-                            check = detector.get_bool_from_os(dependency)
-                            if negate:
-                                check = not check
-
-                            # Skip if not meeting the requirements of the dependency
-                            if not check:
-                                skip = True
-                                break
-
-                        if skip:
-                            log.debug(
-                                "Skipping '{} {}' due to unmet dependency: {}",
-                                module_name,
-                                class_name,
-                                dependency
-                            )
-                            continue
-
-                    # Building endpoint
-                    endpoint = EndpointElements(custom={})
-
-                    endpoint.cls = ep_class
-                    endpoint.exists = True
-                    endpoint.iscore = iscore
-
-                    # Global tags to be applied to all methods
-                    endpoint.tags = ep_class.labels
-
-                    # base URI
-                    base = ep_class.baseuri
-                    if base not in BASE_URLS:
-                        log.warning("Invalid base {}", base)
-                        base = API_URL
-                    base = base.strip('/')
-                    endpoint.base_uri = base
-
-                    endpoint.uris = {}  # attrs python lib bug?
-                    endpoint.custom['schema'] = {
-                        'expose': ep_class.expose_schema,
-                        'publish': {},
-                    }
-
-                    endpoint.methods = {}
-
-                    mapping_lists = []
-                    for m in ep_class.methods:
-                        method_name = "_{}".format(m)
-                        if not hasattr(ep_class, method_name):
-
-                            method_name = m
-                            if not hasattr(ep_class, method_name):
-                                log.warning(
-                                    "{} configuration not found in {}", m, class_name
-                                )
-                                continue
-                            # Enable this warning to start conversions GET -> _GET
-                            # Find other warning like this by searching:
-                            # **FASTAPI**
-                            # else:
-                            #     log.warning(
-                            #         "Obsolete dict {} in {}", m, class_name
-                            #     )
-
-                        conf = getattr(ep_class, method_name)
-                        kk = conf.keys()
-                        mapping_lists.extend(kk)
-                        endpoint.methods[m.lower()] = copy.deepcopy(conf)
-
-                    if endpoint.custom['schema']['expose']:
-                        for uri in mapping_lists:
-                            total_uri = '/{}{}'.format(endpoint.base_uri, uri)
-                            schema_uri = '{}/schemas{}'.format(API_URL, uri)
-
-                            p = hex(id(endpoint.cls))
-                            self._schema_endpoint.uris[uri + p] = schema_uri
-
-                            self._schemas_map[schema_uri] = total_uri
-
-                    self._endpoints.append(endpoint)
-
-    def do_swagger(self):
+                    continue
+                # Enable this warning to start conversions GET -> _GET
+                # Find other warning like this by searching:
+                # **FASTAPI**
+                # else:
+                #     log.warning(
+                #         "Obsolete dict {} in {}", m, class_name
+                #     )
+
+            conf = getattr(ep_class, method_name)
+            kk = conf.keys()
+            mapping_lists.extend(kk)
+            endpoint.methods[m.lower()] = copy.deepcopy(conf)
+
+        if endpoint.custom['schema']['expose']:
+            for uri in mapping_lists:
+                total_uri = '/{}{}'.format(endpoint.base_uri, uri)
+                schema_uri = '{}/schemas{}'.format(API_URL, uri)
+
+                p = hex(id(endpoint.cls))
+                self._schema_endpoint.uris[uri + p] = schema_uri
+
+                self._schemas_map[schema_uri] = total_uri
+
+        self._endpoints.append(endpoint)
+
+    def do_swagger(self, use_cache=True):
 
         # SWAGGER read endpoints definition
         swag = Swagger(self._endpoints, self)
@@ -272,7 +392,7 @@ class Customizer:
         self._endpoints = swag._endpoints[:]
 
         # SWAGGER validation
-        if not swag.validation(swag_dict):
+        if not swag.validation(swag_dict, use_cache=use_cache):
             log.exit("Current swagger definition is invalid")
 
         self._definitions = swag_dict
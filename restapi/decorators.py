@@ -9,6 +9,10 @@ from restapi.confs import SENTRY_URL
 from restapi.services.authentication.bearer import authentication as auth
 
 from restapi.utilities.htmlcodes import hcodes
+from restapi.utilities.profiler import get_profile_mode, run_profiled
+from restapi.utilities import responses_cache
+from restapi.utilities.singleflight import group as singleflight_group
+from restapi.utilities.singleflight import SINGLEFLIGHT_TIMEOUT
 
 from restapi.utilities.logs import log
 
@@ -92,6 +96,205 @@ def catch_errors(exception=None, catch_generic=True, **kwargs):
     return decorator
 
 
+def profile(func=None, mode=None):
+    """
+    Profile the endpoint method when sampled (PROFILE_SAMPLE_RATE)
+    or requested by an admin with the X-Profile header.
+    To be placed below auth.required, to recognize admins.
+    Usage: @decorators.profile or @decorators.profile(mode='sampling')
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+
+            profile_mode = get_profile_mode(self.auth, default=mode)
+            if profile_mode is None:
+                return func(self, *args, **kwargs)
+
+            name = "{}.{}".format(self.__class__.__name__, func.__name__)
+            return run_profiled(profile_mode, name, func, self, *args, **kwargs)
+
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def check_below_auth(name, func):
+    """
+    Decorators returning responses without executing func (shared or cached)
+    have to run after the authentication checks
+    """
+
+    # set by auth.required on its wrapper, copied by every wraps above it
+    if getattr(func, 'auth_required', False):
+        raise AttributeError(
+            "decorators.{} has to be placed below auth.required in {}".format(
+                name, func.__qualname__
+            )
+        )
+
+
+def cache(ttl=60, tags=None, per_user=True):
+    """
+    Cache the serialized GET responses (only 200 OK, streams are excluded)
+    The key includes route, arguments and Accept header, plus current user
+    and roles if per_user. With per_user=False the response cached for a user
+    is also returned to the others.
+    Entries expire after ttl seconds or when one of their tags is invalidated
+    by a method decorated with cache_invalidate, in any worker.
+    To be placed below auth.required (enforced): a hit is returned without
+    executing the decorators below
+    """
+
+    tags = list(tags or [])
+
+    def decorator(func):
+        check_below_auth('cache', func)
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+
+            from flask import request
+            from werkzeug.wrappers import Response
+            from restapi.rest.response import ResponseMaker
+
+            if request.method != 'GET':
+                return func(self, *args, **kwargs)
+
+            user = None
+            if per_user:
+                user = "anonymous"
+                current_user = self.auth.get_user()
+                if current_user is not None:
+                    roles = sorted(self.auth.get_roles_from_user(current_user))
+                    user = "{}:{}".format(current_user.uuid, ','.join(roles))
+
+            try:
+                backend = responses_cache.get_backend()
+                versions = backend.get_versions(tags)
+                key = responses_cache.get_cache_key(request, tags, versions, user)
+                cached = backend.get(key)
+            except Exception as e:
+                log.warning("Response cache not available: {}", e)
+                return func(self, *args, **kwargs)
+
+            if cached is not None:
+                response = responses_cache.load_response(cached)
+                response.headers['X-Cache'] = 'HIT'
+                return ResponseMaker.make_conditional(response)
+
+            response = func(self, *args, **kwargs)
+
+            if (
+                isinstance(response, Response)
+                and response.status_code == hcodes.HTTP_OK_BASIC
+                and not response.is_streamed
+            ):
+                try:
+                    backend.set(key, responses_cache.dump_response(response), ttl)
+                except Exception as e:
+                    log.warning("Unable to cache the response: {}", e)
+                response.headers['X-Cache'] = 'MISS'
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def cache_invalidate(*tags):
+    """
+    Invalidate the cached responses with the given tags
+    when the decorated (write) method succeeds
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+
+            from werkzeug.wrappers import Response
+
+            response = func(self, *args, **kwargs)
+
+            if isinstance(response, Response):
+                status = response.status_code
+            elif isinstance(response, tuple) and len(response) > 1:
+                status = response[1]
+            else:
+                status = hcodes.HTTP_OK_BASIC
+
+            if status < 400:
+                responses_cache.invalidate(tags)
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def singleflight(timeout=SINGLEFLIGHT_TIMEOUT, per_user=True):
+    """
+    Concurrent identical GET requests (same route, arguments, Accept and
+    conditional headers, plus user if per_user) are served by a single
+    execution of the endpoint method. Waiters receive a copy of the response
+    or the same exception, and a 503 after timeout seconds.
+    With per_user=False the response of a user is also returned to the others.
+    To be placed below auth.required (enforced). For connector client calls
+    see restapi.utilities.singleflight.singleflight
+    """
+
+    def decorator(func):
+        check_below_auth('singleflight', func)
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+
+            from flask import request
+            from werkzeug.wrappers import Response
+
+            if request.method != 'GET':
+                return func(self, *args, **kwargs)
+
+            user = None
+            if per_user:
+                current_user = self.auth.get_user()
+                user = current_user.uuid if current_user is not None else "anonymous"
+            # the leader response is already conditional (e.g. a 304)
+            key = responses_cache.get_cache_key(
+                request, [], [], user, headers=responses_cache.CONDITIONAL_HEADERS
+            )
+
+            caller = object()
+
+            def shared_call():
+                response = func(self, *args, **kwargs)
+                # waiters cannot share a response object (nor consume a stream)
+                dumped = None
+                if isinstance(response, Response) and not response.is_streamed:
+                    dumped = responses_cache.dump_response(response)
+                return caller, response, dumped
+
+            executor, response, dumped = singleflight_group.do(
+                key, timeout, shared_call
+            )
+
+            if executor is caller:
+                return response
+            if dumped is not None:
+                return responses_cache.load_response(dumped)
+            # not shareable, executed again
+            return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 def catch_graph_exceptions(func):
     @wraps(func)
     def wrapper(self, *args, **kwargs):
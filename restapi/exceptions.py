@@ -17,3 +17,13 @@ class RestApiException(Exception):
             status_code = hcodes.HTTP_BAD_NOTFOUND
         super(RestApiException, self).__init__(exception)
         self.status_code = status_code
+
+
+class SingleFlightTimeout(RestApiException):
+    """ Waited too long for the computation of an identical request """
+
+    def __init__(self, key):
+        super(SingleFlightTimeout, self).__init__(
+            "Timeout waiting for {}".format(key),
+            status_code=hcodes.HTTP_SERVICE_UNAVAILABLE,
+        )
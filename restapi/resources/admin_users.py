@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
 import re
-from sqlalchemy.exc import IntegrityError
 
 from restapi import decorators
 from restapi.rest.definition import EndpointResource
@@ -409,6 +408,8 @@ Password: "{}"
 
         if self.sql_enabled:
 
+            from sqlalchemy.exc import IntegrityError
+
             try:
                 self.auth.db.session.commit()
             except IntegrityError:
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
-from flask import jsonify
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import Response
 
 from restapi.rest.definition import EndpointResource
+from restapi.rest.response import ResponseMaker
 from restapi.services.detect import detector
 from restapi.exceptions import RestApiException
 from restapi import decorators
@@ -18,9 +22,18 @@ class Status
 class Verify
     GET: verify connection to a single service
 
+class Stacks
+    GET: stacks sampled by the continuous profiler, per route
+
 class SwaggerSpecifications
     GET: return swagger specs
 
+class Metrics
+    GET: return metrics of all the workers in the Prometheus text format
+
+class Profiles
+    GET: list saved profiles or download one of them
+
 class Queue
     GET: get list of celery tasks
     PUT: revoke a (not running) task
@@ -55,7 +68,10 @@ class Verify(EndpointResource):
     GET = {
         "/status/<service>": {
             "summary": "Check if the API server is able to reach the given service",
-            "description": "You may use this URI to monitor the network link between API server and a given service",
+            "description": (
+                "You may use this URI to monitor the network link "
+                "between API server and a given service"
+            ),
             "responses": {
                 "200": {"description": "Server is able to reach the service!"}
             },
@@ -78,6 +94,49 @@ class Verify(EndpointResource):
         return self.response("Service is reachable: {}".format(service))
 
 
+class Stacks(EndpointResource):
+    """ Aggregated stacks from the continuous profiler """
+
+    labels = ["admin"]
+    GET = {
+        "/admin/stacks": {
+            "summary": (
+                "Most frequent stacks per route, sampled by the continuous profiler"
+            ),
+            "description": (
+                "Requests slower than SLOW_REQUEST_THRESHOLD are saved in "
+                "/admin/profiles"
+            ),
+            "responses": {"200": {"description": "Stacks per route"}},
+        }
+    }
+
+    @decorators.catch_errors()
+    @decorators.auth.required(roles=['admin_root'])
+    def get(self):
+
+        from restapi.utilities.sampler import sampler
+
+        if not sampler.started:
+            raise RestApiException(
+                "Continuous profiler is not enabled",
+                status_code=hcodes.HTTP_BAD_NOTFOUND,
+            )
+
+        return self.response({
+            'interval': sampler.interval,
+            'routes': sampler.collect(),
+        })
+
+
+# (definitions id, scheme, host) -> (etag, body, compressed bodies by encoding)
+# in order of use. host comes from the request: the least recently used
+# variants are dropped and bodies are only compressed when requested
+SPECS_CACHE = OrderedDict()
+SPECS_CACHE_LOCK = threading.Lock()
+MAX_SPECS_VARIANTS = 16
+
+
 class SwaggerSpecifications(EndpointResource):
     """
     Specifications output throught Swagger (open API) standards
@@ -90,29 +149,150 @@ class SwaggerSpecifications(EndpointResource):
             "summary": "Specifications output throught Swagger (open API) standards",
             "responses": {
                 "200": {
-                    "description": "a JSON with all endpoint defined with Swagger standards"
+                    "description": (
+                        "a JSON with all endpoint defined with Swagger standards"
+                    )
                 }
             },
         }
     }
 
+    @staticmethod
+    def get_serialized_specs(definitions, scheme, host):
+
+        key = (id(definitions), scheme, host)
+        with SPECS_CACHE_LOCK:
+            specs = SPECS_CACHE.get(key)
+            if specs is not None:
+                SPECS_CACHE.move_to_end(key)
+                return specs
+
+        from restapi.rest.encoders import dumps
+
+        # NOTE: the shared dictionary is never modified, a shallow copy is enough
+        swagjson = dict(definitions)
+        swagjson['host'] = host
+        swagjson['schemes'] = [scheme]
+
+        body = dumps(swagjson)
+        specs = (hashlib.sha1(body).hexdigest(), body, {})
+
+        with SPECS_CACHE_LOCK:
+            SPECS_CACHE[key] = specs
+            while len(SPECS_CACHE) > MAX_SPECS_VARIANTS:
+                SPECS_CACHE.popitem(last=False)
+        return specs
+
     def get(self):
 
         # NOTE: swagger dictionary is read only once, at server init time
-        swagjson = mem.customizer._definitions
+        definitions = mem.customizer._definitions
 
         # NOTE: changing dinamically options, based on where the client lies
         from restapi.confs import PRODUCTION
         from restapi.confs import get_api_url
+        from restapi.rest.compression import negotiate_encoding, compress_static
         from flask import request
 
         api_url = get_api_url(request, PRODUCTION)
         scheme, host = api_url.rstrip('/').split('://')
-        swagjson['host'] = host
-        swagjson['schemes'] = [scheme]
 
-        # Jsonify, so we skip custom response building
-        return jsonify(swagjson)
+        etag, body, compressed = self.get_serialized_specs(definitions, scheme, host)
+
+        # Serialized once, so we skip custom response building
+        encoding = negotiate_encoding(request)
+        if encoding is None:
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+        else:
+            response = Response(
+                compress_static(body, encoding, compressed),
+                mimetype='application/json',
+            )
+            response.headers['Content-Encoding'] = encoding
+            response.set_etag(etag, weak=True)
+        response.vary.add('Accept-Encoding')
+
+        return ResponseMaker.make_conditional(response)
+
+
+class Metrics(EndpointResource):
+    """ Numeric telemetry, only reachable from internal networks """
+
+    labels = ["helpers"]
+
+    GET = {
+        "/metrics": {
+            "summary": "Requests, latencies and connectors metrics",
+            "description": (
+                "Prometheus text format, aggregated over all the workers. "
+                "Only allowed from METRICS_ALLOWED_NETWORKS"
+            ),
+            "responses": {"200": {"description": "Metrics in the text format"}},
+        }
+    }
+
+    def get(self):
+
+        from flask import request, Response
+        from restapi.utilities.metrics import metrics, is_allowed_request
+
+        if not is_allowed_request(request):
+            raise RestApiException(
+                "You are not allowed to access metrics",
+                status_code=hcodes.HTTP_BAD_FORBIDDEN,
+            )
+
+        return Response(
+            metrics.render(), mimetype='text/plain; version=0.0.4'
+        )
+
+
+class Profiles(EndpointResource):
+    """ Profiles collected by decorators.profile """
+
+    labels = ["admin"]
+
+    GET = {
+        "/admin/profiles": {
+            "summary": "List of saved profiles, from the newest",
+            "responses": {"200": {"description": "List of profile ids"}},
+        },
+        "/admin/profiles/<profile_id>": {
+            "summary": "Download a profile",
+            "description": (
+                "pstats file (.prof) or collapsed stacks for flamegraphs (.folded)"
+            ),
+            "responses": {"200": {"description": "The profile content"}},
+        },
+    }
+
+    @decorators.catch_errors()
+    @decorators.auth.required(roles=['admin_root'])
+    def get(self, profile_id=None):
+
+        from flask import Response
+        from restapi.utilities.profiler import list_profiles, read_profile
+
+        if profile_id is None:
+            return self.response(list_profiles())
+
+        content = read_profile(profile_id)
+        if content is None:
+            raise RestApiException(
+                "Profile not found: {}".format(profile_id),
+                status_code=hcodes.HTTP_BAD_NOTFOUND,
+            )
+
+        if profile_id.endswith('.folded'):
+            return Response(content, mimetype='text/plain')
+        return Response(
+            content,
+            mimetype='application/octet-stream',
+            headers={
+                'Content-Disposition': 'attachment; filename={}'.format(profile_id)
+            },
+        )
 
 
 ###########################
@@ -146,7 +326,9 @@ if detector.check_availability('celery'):
                 "summary": "Delete a task",
                 "responses": {
                     "204": {
-                        "description": "The task with specified id was succesfully deleted"
+                        "description": (
+                            "The task with specified id was succesfully deleted"
+                        )
                     }
                 },
             }
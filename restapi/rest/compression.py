@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+Response compression (gzip, and brotli when installed) negotiated with
+Accept-Encoding. Responses smaller than COMPRESSION_MIN_SIZE are not
+compressed, streamed responses are compressed chunk by chunk.
+Already compressed mimetypes, file downloads and ranged requests are skipped.
+"""
+
+import os
+import zlib
+
+from restapi.utilities.logs import log
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSION_ENABLE = os.environ.get('COMPRESSION_ENABLE', '1') == '1'
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+# 1 (fastest) to 9 (smallest)
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))
+# 0 (fastest) to 11 (smallest), high values are too slow for dynamic content
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 4))
+
+ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+UNCOMPRESSED_STATUS = (204, 206, 304)
+COMPRESSED_MIMETYPES = {
+    'application/gzip',
+    'application/x-gzip',
+    'application/zip',
+    'application/x-bzip2',
+    'application/x-xz',
+    'application/x-7z-compressed',
+    'application/x-rar-compressed',
+    'application/octet-stream',
+    'application/msgpack',
+    'application/cbor',
+    'application/pdf',
+}
+COMPRESSED_MIMETYPE_PREFIXES = ('image/', 'video/', 'audio/', 'font/woff')
+
+
+def is_compressible(request, response):
+
+    if response.status_code in UNCOMPRESSED_STATUS or response.status_code < 200:
+        return False
+    # file downloads (send_file) and ranges of them
+    if response.direct_passthrough or 'Content-Range' in response.headers:
+        return False
+    if 'Range' in request.headers:
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+
+    mimetype = response.mimetype or ''
+    if mimetype in COMPRESSED_MIMETYPES:
+        return False
+    if mimetype.startswith(COMPRESSED_MIMETYPE_PREFIXES):
+        return False
+
+    return True
+
+
+def get_compressor(encoding):
+    """ Functions to compress a chunk, flush what is buffered and finish """
+
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+
+    # wbits = 16 + MAX_WBITS for the gzip container
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def flush():
+        return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    return compressor.compress, flush, compressor.flush
+
+
+def compress_stream(chunks, encoding):
+
+    compress, flush, finish = get_compressor(encoding)
+    for chunk in chunks:
+        # an empty flush would still produce a (useless) sync marker
+        if not chunk:
+            continue
+        # every chunk is sent as soon as produced, to keep a fast first byte
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def compress_response(request, response):
+
+    if not COMPRESSION_ENABLE or not is_compressible(request, response):
+        return response
+
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        compress, _, finish = get_compressor(encoding)
+        response.set_data(compress(data) + finish())
+        log.verbose(
+            "Response compressed with {}: {} -> {}",
+            encoding, len(data), response.content_length
+        )
+
+    response.headers['Content-Encoding'] = encoding
+
+    # the compressed body is no longer byte-equal to the one hashed in the ETag
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+
+def compress_static(data, encoding, variants):
+    """
+    Compressed variant of a static body, computed at the first request
+    and saved in variants (a dictionary by encoding)
+    """
+
+    compressed = variants.get(encoding)
+    if compressed is None:
+        compress, _, finish = get_compressor(encoding)
+        compressed = variants[encoding] = compress(data) + finish()
+    return compressed
+
+
+def negotiate_encoding(request):
+    """ The best encoding accepted by the client, if compression is enabled """
+    if not COMPRESSION_ENABLE:
+        return None
+    return request.accept_encodings.best_match(ENCODINGS)
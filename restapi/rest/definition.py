@@ -5,17 +5,17 @@ The most basic (and standard) Rest Resource
 we could provide back then
 """
 
-from datetime import datetime
+from datetime import datetime, timezone
 from flask import current_app, make_response
 from flask_restful import request, Resource, reqparse
 from flask_apispec import MethodResource
 from jsonschema.exceptions import ValidationError
-from typing import List, Dict
-from neomodel import StructuredNode
+from typing import List, Dict, TYPE_CHECKING
 
 from restapi.confs import API_URL, WRAP_RESPONSE
 from restapi.exceptions import RestApiException
 from restapi.rest.response import ResponseMaker
+from restapi.rest.encoders import binary_formats, get_binary_input
 from restapi.swagger import input_validation
 from restapi.services.authentication.bearer import HTTPTokenAuth
 from restapi.utilities.htmlcodes import hcodes
@@ -24,6 +24,10 @@ from restapi.utilities.time import string_from_timestamp
 from restapi.services.detect import detector
 from restapi.utilities.logs import log, obfuscate_dict
 
+if TYPE_CHECKING:  # pragma: no cover
+    # only for type hints: neomodel is not loaded when neo4j is not enabled
+    from neomodel import StructuredNode
+
 ###################
 # Paging costants
 CURRENTPAGE_KEY = 'currentpage'
@@ -91,6 +95,10 @@ class EndpointResource(Resource):
         return instance
 
     def init_parameters(self):
+        # Conditional GET validators, see not_modified
+        self._etag = None
+        self._last_modified = None
+
         # Make sure you can parse arguments at every call
         self._args = {}
         self._json_args = {}
@@ -183,7 +191,10 @@ class EndpointResource(Resource):
         # request.data or request.json, otherwise it get lost
         if len(self._json_args) < 1 and request.mimetype != 'application/octet-stream':
             try:
-                self._json_args = request.get_json(force=forcing)
+                if request.mimetype in binary_formats:
+                    self._json_args = get_binary_input(request)
+                else:
+                    self._json_args = request.get_json(force=forcing)
             except Exception as e:
                 log.verbose("Error retrieving input parameters, {}", e)
 
@@ -271,7 +282,7 @@ class EndpointResource(Resource):
         return self.auth.get_user()
 
     @staticmethod
-    def obj_serialize(obj: StructuredNode, keys: List[str]) -> Dict[str, str]:
+    def obj_serialize(obj: 'StructuredNode', keys: List[str]) -> Dict[str, str]:
         attributes: Dict[str, str] = {}
         for k in keys:
             attributes[k] = EndpointResource.serialize(obj, k)
@@ -279,7 +290,7 @@ class EndpointResource(Resource):
         return attributes
 
     @staticmethod
-    def serialize(obj: StructuredNode, key: str) -> str:
+    def serialize(obj: 'StructuredNode', key: str) -> str:
 
         attribute = getattr(obj, key)
         if attribute is None:
@@ -349,6 +360,12 @@ class EndpointResource(Resource):
                 log.warning("Forcing 500 SERVER ERROR because only errors are returned")
                 code = hcodes.HTTP_SERVER_ERROR
 
+        # Large collections: rows are encoded while sent to the client
+        if errors is None and ResponseMaker.is_stream(content):
+            return ResponseMaker.stream_response(
+                content, code, headers, response_wrapper=response_wrapper, meta=meta
+            )
+
         # Request from a ApiSpec endpoint, skipping all flask-related following steps
         if isinstance(self, MethodResource):
             if content is None:
@@ -368,6 +385,13 @@ class EndpointResource(Resource):
 
         response = make_response(r)
 
+        response = ResponseMaker.make_conditional(
+            response,
+            etag=self._etag,
+            weak=True,
+            last_modified=self._last_modified,
+        )
+
         # Avoid duplicated Content-type
         content_type = None
         for idx, val in enumerate(response.headers):
@@ -386,6 +410,46 @@ class EndpointResource(Resource):
 
         return response
 
+    def not_modified(self, version=None, last_modified=None):
+        """
+        Cheap conditional GET, to be called before building the content:
+        version is any value changing with the content (e.g. a counter or a
+        modification time). Returns a 304 response if the client copy is still
+        valid, otherwise None and the validators will be added to the response
+        """
+
+        if version is not None:
+            self._etag = ResponseMaker.get_version_etag(version)
+        if last_modified is not None:
+            # HTTP dates are naive UTC with a resolution of seconds
+            if last_modified.tzinfo is not None:
+                last_modified = last_modified.astimezone(timezone.utc)
+            self._last_modified = last_modified.replace(microsecond=0, tzinfo=None)
+
+        if request.method not in ('GET', 'HEAD'):
+            return None
+
+        if self._etag is not None:
+            if request.if_none_match.contains_weak(self._etag):
+                return self.not_modified_response()
+            # If-Modified-Since is ignored when If-None-Match is present
+            if request.if_none_match:
+                return None
+
+        if self._last_modified is not None and request.if_modified_since is not None:
+            if self._last_modified <= request.if_modified_since:
+                return self.not_modified_response()
+
+        return None
+
+    def not_modified_response(self):
+        response = make_response('', hcodes.HTTP_NOT_MODIFIED)
+        if self._etag is not None:
+            response.set_etag(self._etag, weak=True)
+        if self._last_modified is not None:
+            response.last_modified = self._last_modified
+        return response
+
     def empty_response(self):
         """ Empty response as defined by the protocol """
         return self.response("", code=hcodes.HTTP_OK_NORESPONSE)
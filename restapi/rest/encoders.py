@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+
+"""
+JSON encoders used to build the responses.
+
+The encoder is selected by JSON_ENCODER (orjson by default, when installed,
+otherwise the standard json module). Other encoders can be added with
+register_encoder: they receive the content, indent and sort_keys and return bytes.
+
+As with flask.jsonify, keys are sorted if JSON_SORT_KEYS is enabled and
+datetime and date are encoded as HTTP dates (RFC 1123), or in ISO 8601 with
+JSON_DATES=iso. time is always encoded in ISO 8601, UUID, Decimal and bson
+ObjectId as strings, sets and tuples as lists.
+The same types are supported by the streaming CSV and XML encoders
+and by the binary formats (MessagePack and CBOR, when installed).
+"""
+
+import io
+import os
+import re
+import csv
+import json
+import uuid
+import decimal
+from datetime import date, datetime, time, timezone
+from xml.sax.saxutils import escape as xml_escape
+
+from flask import current_app
+from werkzeug.http import http_date
+
+from restapi.utilities.logs import log
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+JSON_MIMETYPE = 'application/json'
+DEFAULT_ENCODER = 'orjson' if orjson is not None else 'json'
+JSON_ENCODER = os.environ.get('JSON_ENCODER', DEFAULT_ENCODER)
+# http (RFC 1123, as flask.jsonify) or iso (ISO 8601)
+JSON_DATES = os.environ.get('JSON_DATES', 'http')
+
+
+def format_date(obj):
+
+    if JSON_DATES == 'iso' or isinstance(obj, time):
+        return obj.isoformat()
+    # same as the flask JSONEncoder
+    if isinstance(obj, datetime):
+        return http_date(obj.utctimetuple())
+    return http_date(obj.timetuple())
+
+
+def default(obj):
+    """ Types not natively handled by the encoders """
+
+    if isinstance(obj, (datetime, date, time)):
+        return format_date(obj)
+    if isinstance(obj, (uuid.UUID, decimal.Decimal)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    # bson ObjectId, without importing bson (only available with mongo)
+    if type(obj).__name__ == 'ObjectId':
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(
+        "Object of type {} is not JSON serializable".format(type(obj).__name__)
+    )
+
+
+def json_dumps(content, indent=False, sort_keys=False):
+    return json.dumps(
+        content,
+        default=default,
+        indent=2 if indent else None,
+        separators=None if indent else (',', ':'),
+        sort_keys=sort_keys,
+    ).encode('utf-8')
+
+
+def orjson_dumps(content, indent=False, sort_keys=False):
+    option = orjson.OPT_NON_STR_KEYS
+    if JSON_DATES != 'iso':
+        # datetimes are otherwise always encoded by orjson in ISO 8601
+        option |= orjson.OPT_PASSTHROUGH_DATETIME
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    try:
+        return orjson.dumps(content, default=default, option=option)
+    except TypeError as e:
+        # e.g. integers over 64 bits are only supported by json
+        log.verbose("orjson failed, fallback to json: {}", e)
+        return json_dumps(content, indent=indent, sort_keys=sort_keys)
+
+
+encoders = {'json': json_dumps}
+if orjson is not None:
+    encoders['orjson'] = orjson_dumps
+
+
+def register_encoder(name, dumps):
+    encoders[name] = dumps
+
+
+def get_encoder(name=None):
+
+    if name is None:
+        name = JSON_ENCODER
+
+    encoder = encoders.get(name)
+    if encoder is None:
+        log.warning("Unknown JSON encoder {}, using {}", name, DEFAULT_ENCODER)
+        encoder = encoders[name] = encoders[DEFAULT_ENCODER]
+    return encoder
+
+
+def dumps(content, indent=False, sort_keys=None):
+    if sort_keys is None:
+        # outside of the app context the flask default is used
+        sort_keys = current_app.config['JSON_SORT_KEYS'] if current_app else True
+    return get_encoder()(content, indent=indent, sort_keys=sort_keys)
+
+
+###########################
+# Streaming encoders, producing bytes one row at a time
+
+CSV_MIMETYPE = 'text/csv'
+XML_MIMETYPE = 'application/xml'
+XML_INVALID_NAME_CHARS = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def flatten(row, prefix='', output=None):
+    """ Nested dictionaries as dotted keys, lists encoded as json """
+
+    if output is None:
+        output = {}
+    for key, value in row.items():
+        name = "{}{}".format(prefix, key)
+        if isinstance(value, dict):
+            flatten(value, prefix="{}.".format(name), output=output)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            output[name] = dumps(value).decode('utf-8')
+        else:
+            output[name] = value
+    return output
+
+
+def to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    try:
+        return default(value)
+    except TypeError:
+        return str(value)
+
+
+def csv_rows(rows):
+    """
+    The header is inferred from the first row (dictionaries are flattened),
+    keys not in the header are ignored in the following rows
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = None
+    for row in rows:
+        if isinstance(row, dict):
+            row = flatten(row)
+            if header is None:
+                header = list(row.keys())
+                writer.writerow(header)
+            writer.writerow([to_text(row.get(key)) for key in header])
+        elif isinstance(row, (list, tuple)):
+            writer.writerow([to_text(value) for value in row])
+        else:
+            writer.writerow([to_text(row)])
+
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+def xml_name(name):
+    name = XML_INVALID_NAME_CHARS.sub('_', str(name))
+    if not name or not (name[0].isalpha() or name[0] == '_'):
+        name = "_{}".format(name)
+    return name
+
+
+def xml_element(name, value):
+
+    name = xml_name(name)
+    if value is None:
+        return "<{}/>".format(name)
+    if isinstance(value, dict):
+        children = ''.join(xml_element(k, v) for k, v in value.items())
+        return "<{0}>{1}</{0}>".format(name, children)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        children = ''.join(xml_element('item', v) for v in value)
+        return "<{0}>{1}</{0}>".format(name, children)
+    return "<{0}>{1}</{0}>".format(name, xml_escape(to_text(value)))
+
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+def xml_document(content, root='response'):
+    return XML_DECLARATION + xml_element(root, content).encode('utf-8')
+
+
+def xml_rows(rows, meta=None):
+    """
+    Rows as <item> elements of <data>, within the Response/Meta envelope
+    if meta is given: a function returning Meta from the number of elements
+    """
+
+    if meta is None:
+        yield XML_DECLARATION + b'<data>'
+    else:
+        yield XML_DECLARATION + b'<response><Response><data>'
+
+    elements = 0
+    for row in rows:
+        yield xml_element('item', row).encode('utf-8')
+        elements += 1
+
+    if meta is None:
+        yield b'</data>'
+    else:
+        yield b'</data><errors/></Response>'
+        yield xml_element('Meta', meta(elements)).encode('utf-8')
+        yield b'</response>'
+
+
+###########################
+# Binary formats, for both responses and request bodies
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+CBOR_MIMETYPE = 'application/cbor'
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover
+    cbor2 = None
+
+
+def msgpack_dumps(content):
+    return msgpack.packb(content, default=default, use_bin_type=True)
+
+
+def msgpack_loads(content):
+    return msgpack.unpackb(content, raw=False)
+
+
+def cbor_default(encoder, value):
+    encoder.encode(default(value))
+
+
+def cbor_dumps(content):
+    # naive datetimes are considered UTC, cbor2 requires a timezone
+    return cbor2.dumps(content, default=cbor_default, timezone=timezone.utc)
+
+
+def cbor_loads(content):
+    return cbor2.loads(content)
+
+
+# mimetype -> (dumps, loads)
+binary_formats = {}
+if msgpack is not None:
+    binary_formats[MSGPACK_MIMETYPE] = (msgpack_dumps, msgpack_loads)
+if cbor2 is not None:
+    binary_formats[CBOR_MIMETYPE] = (cbor_dumps, cbor_loads)
+
+
+def get_binary_input(request):
+    """
+    Decoded body of a binary request, None if not a binary format.
+    Like request.get_json, the decoded body is cached in the request
+    """
+
+    if request.mimetype not in binary_formats:
+        return None
+
+    cached = getattr(request, '_cached_binary_input', None)
+    if cached is None:
+        _, loads = binary_formats[request.mimetype]
+        cached = loads(request.get_data(cache=True))
+        request._cached_binary_input = cached
+    return cached
@@ -1,21 +1,92 @@
 # -*- coding: utf-8 -*-
 
-from flask import Response, render_template, jsonify
+import hashlib
+from collections.abc import Iterator
+from flask import Response, render_template, current_app, stream_with_context
+from flask import make_response
 from werkzeug.wrappers import Response as WerkzeugResponse
+from restapi.rest.encoders import dumps, JSON_MIMETYPE
+from restapi.rest.encoders import CSV_MIMETYPE, csv_rows
+from restapi.rest.encoders import XML_MIMETYPE, xml_rows, xml_document
+from restapi.rest.encoders import binary_formats
 from restapi.utilities.htmlcodes import hcodes
 from restapi.utilities.logs import log
 
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Formats of the responses, chosen with the Accept header
+RESPONSE_FORMATS = ['text/html', JSON_MIMETYPE, CSV_MIMETYPE, XML_MIMETYPE]
+RESPONSE_FORMATS.extend(binary_formats)
+STREAM_FORMATS = [JSON_MIMETYPE, NDJSON_MIMETYPE, CSV_MIMETYPE, XML_MIMETYPE]
+STREAM_FORMATS.extend(binary_formats)
+# Encoded rows are sent in chunks of (at least) this size, except the first
+STREAM_CHUNK_SIZE = 65536
+
+
+def chunked(pieces):
+    """ Join small pieces of bytes, the first one is sent immediately """
+
+    buffer = []
+    size = 0
+    first = True
+    for piece in pieces:
+        if first:
+            first = False
+            yield piece
+            continue
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
 
 class ResponseMaker:
 
     @staticmethod
     def get_accepted_formats():
+        """
+        Mimetypes accepted by the client, without parameters, from the most
+        preferred: by q-value, then in the order sent by the client.
+        Mimetypes with q=0 are not acceptable and excluded
+        """
         from flask import request
 
-        for val in request.headers:
-            if val[0] == "Accept":
-                return [x.strip() for x in val[1].split(',')]
-        return ['*/*']
+        accept = request.headers.get('Accept')
+        if not accept:
+            return ['*/*']
+
+        formats = []
+        for position, value in enumerate(accept.split(',')):
+            mimetype, *params = [x.strip() for x in value.split(';')]
+            quality = 1.0
+            for param in params:
+                key, _, param_value = param.partition('=')
+                if key.strip().lower() == 'q':
+                    try:
+                        quality = float(param_value)
+                    except ValueError:
+                        quality = 0.0
+            if mimetype and quality > 0:
+                formats.append((-quality, position, mimetype.lower()))
+
+        return [mimetype for _, _, mimetype in sorted(formats)]
+
+    @staticmethod
+    def get_response_format(accepted_formats, available):
+        """
+        The first accepted format among the available ones,
+        wildcards are answered with JSON (if available)
+        """
+
+        for mimetype in accepted_formats:
+            if mimetype in available:
+                return mimetype
+            if mimetype in ('*/*', 'application/*') and JSON_MIMETYPE in available:
+                return JSON_MIMETYPE
+        return None
 
     @staticmethod
     def add_to_dict(mydict, content, key='content'):
@@ -44,18 +115,167 @@ class ResponseMaker:
             headers=headers
         )
 
+    @staticmethod
+    def json_response(content):
+        """ Like flask.jsonify, with the configured (fast) encoder """
+
+        indent = current_app.config['JSONIFY_PRETTYPRINT_REGULAR'] or current_app.debug
+        return Response(dumps(content, indent=indent), mimetype=JSON_MIMETYPE)
+
+    @staticmethod
+    def make_conditional(response, etag=None, weak=False, last_modified=None):
+        """
+        Add validators (ETag and Last-Modified) to a GET response and turn it
+        into a 304 if the client copy is still valid (If-None-Match and
+        If-Modified-Since). Without an etag the body is hashed (strong ETag)
+        """
+
+        from flask import request
+
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return response
+
+        if last_modified is not None:
+            response.last_modified = last_modified
+
+        if etag is not None:
+            response.set_etag(etag, weak=weak)
+        elif not response.is_streamed and 'ETag' not in response.headers:
+            response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+
+        return response.make_conditional(request)
+
+    @staticmethod
+    def get_version_etag(version):
+        """ Weak ETag from an endpoint provided version key """
+        return hashlib.sha1(str(version).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def is_stream(content):
+        """ Generators (and any other iterator) are streamed """
+        return isinstance(content, Iterator)
+
+    @staticmethod
+    def binary_response(content, mimetype):
+        dumps_binary, _ = binary_formats[mimetype]
+        return Response(dumps_binary(content), mimetype=mimetype)
+
+    @staticmethod
+    def binary_rows(rows, mimetype):
+        """ A sequence of objects, to be read with a streaming unpacker """
+        dumps_binary, _ = binary_formats[mimetype]
+        for row in rows:
+            yield dumps_binary(row)
+
+    @staticmethod
+    def ndjson_rows(rows):
+        for row in rows:
+            yield dumps(row) + b'\n'
+
+    @staticmethod
+    def json_array_rows(rows, code, wrapped, custom_metas=None):
+        """
+        A JSON array, within the envelope of wrapped_response if wrapped
+        """
+
+        yield b'{"Response":{"data":[' if wrapped else b'['
+
+        elements = 0
+        for row in rows:
+            if elements > 0:
+                yield b',' + dumps(row)
+            else:
+                yield dumps(row)
+            elements += 1
+
+        if not wrapped:
+            yield b']'
+            return
+
+        # Meta follows the data, to include the number of elements
+        meta = ResponseMaker.stream_meta(code, elements, custom_metas)
+        yield b'],"errors":null},"Meta":' + dumps(meta) + b'}'
+
+    @staticmethod
+    def stream_meta(code, elements, custom_metas=None):
+        """ Meta of wrapped_response, for a list of elements """
+
+        meta = {
+            'data_type': str(list),
+            'elements': elements,
+            'errors': 0,
+            'status': code,
+        }
+        if custom_metas is not None:
+            meta.update(custom_metas)
+        return meta
+
+    @staticmethod
+    def is_streamable_wrapper(response_wrapper):
+        """ Only the envelope of wrapped_response can be streamed """
+        return response_wrapper in (None, ResponseMaker.wrapped_response)
+
+    @staticmethod
+    def stream_response(rows, code, headers, response_wrapper=None, meta=None):
+        """
+        Encode rows one at a time, with chunked transfer:
+        MessagePack or CBOR (a sequence of objects, not enveloped), NDJSON,
+        CSV or XML if requested by the client, otherwise a JSON array
+        (JSON and XML are wrapped in the Response/Meta envelope if enabled,
+        with meta as custom_metas).
+        Other response wrappers build their envelope from the whole content:
+        rows are collected and the response is not streamed
+        """
+
+        if not ResponseMaker.is_streamable_wrapper(response_wrapper):
+            return make_response(ResponseMaker.generate_response(
+                list(rows), code, None, headers, False, meta, response_wrapper
+            ))
+
+        mimetype = ResponseMaker.get_response_format(
+            ResponseMaker.get_accepted_formats(), STREAM_FORMATS
+        )
+        if mimetype in binary_formats:
+            pieces = ResponseMaker.binary_rows(rows, mimetype)
+        elif mimetype == NDJSON_MIMETYPE:
+            pieces = ResponseMaker.ndjson_rows(rows)
+        elif mimetype == CSV_MIMETYPE:
+            pieces = csv_rows(rows)
+        elif mimetype == XML_MIMETYPE:
+            xml_meta = None
+            if response_wrapper is not None:
+                def xml_meta(elements):
+                    return ResponseMaker.stream_meta(code, elements, meta)
+            pieces = xml_rows(rows, meta=xml_meta)
+        else:
+            mimetype = JSON_MIMETYPE
+            pieces = ResponseMaker.json_array_rows(
+                rows, code, wrapped=response_wrapper is not None, custom_metas=meta
+            )
+
+        # rows can still use the request context (e.g. db sessions) while streaming
+        return Response(
+            stream_with_context(chunked(pieces)),
+            mimetype=mimetype,
+            status=code,
+            headers=headers,
+        )
+
     @staticmethod
     def generate_response(content, code, errors, headers,
                           head_method, meta, response_wrapper=None):
         """
         Generating from our user/custom/internal response
         the data necessary for a Flask response (make_response() method):
-        a tuple (content, status, headers)
+        a tuple (content, status, headers), or a complete Response
         """
 
         accepted_formats = ResponseMaker.get_accepted_formats()
+        response_format = ResponseMaker.get_response_format(
+            accepted_formats, RESPONSE_FORMATS
+        )
 
-        if 'text/html' in accepted_formats:
+        if response_format == 'text/html':
             return ResponseMaker.respond_to_browser(content, errors, code, headers)
 
         if response_wrapper is not None:
@@ -66,16 +286,36 @@ class ResponseMaker:
         else:
             final_content = errors
 
-        if '*/*' in accepted_formats or 'application/json' in accepted_formats:
-            final_content = jsonify(final_content)
+        if response_format in binary_formats:
+            final_content = ResponseMaker.binary_response(
+                final_content, response_format
+            )
 
-        elif 'application/xml' in accepted_formats:
-            # TODO: we should convert final_content in XML
-            pass
+        elif response_format == JSON_MIMETYPE:
+            final_content = ResponseMaker.json_response(final_content)
 
-        elif 'text/csv' in accepted_formats:
-            # TODO: we should convert final_content in CSV
-            pass
+        elif (
+            errors is None
+            and isinstance(content, (list, tuple))
+            and ResponseMaker.is_streamable_wrapper(response_wrapper)
+            and response_format in (XML_MIMETYPE, CSV_MIMETYPE)
+        ):
+            # Collections are encoded one row at a time
+            # status and headers are already set in the streamed response
+            return ResponseMaker.stream_response(
+                iter(content), code, headers,
+                response_wrapper=response_wrapper, meta=meta,
+            )
+
+        elif response_format == XML_MIMETYPE:
+            final_content = Response(xml_document(final_content), mimetype=XML_MIMETYPE)
+
+        elif response_format == CSV_MIMETYPE:
+            if errors is None:
+                return ResponseMaker.stream_response(iter([content]), code, headers)
+            else:
+                # errors are not tabular data
+                final_content = ResponseMaker.json_response(final_content)
 
         else:
             log.warning("Unknown accepted format: {}", accepted_formats)
@@ -5,22 +5,29 @@ The Main server factory.
 We create all the internal flask components here.
 """
 import os
-from urllib import parse as urllib_parse
-from flask import Flask, request
-from flask_cors import CORS
+import re
+import time
+from flask import Flask, request, g
 from flask_restful import Api
 from werkzeug.middleware.proxy_fix import ProxyFix
-from geolite2 import geolite2
 from restapi import __version__
 from restapi import confs as config
-from restapi.confs import ABS_RESTAPI_PATH, PRODUCTION, SENTRY_URL
+from restapi.confs import ABS_RESTAPI_PATH, PRODUCTION
 from restapi.confs import get_project_configuration
 from restapi.customization import Customizer
 
 from restapi.services.detect import detector
 from restapi.services.mail import send_mail_is_active, test_smtp_client
 from restapi.utilities.globals import mem
-from restapi.utilities.logs import log, handle_log_output, MAX_CHAR_LEN
+from restapi.utilities.boot import boot_phase, boot_phases
+from restapi.utilities.metrics import metrics
+from restapi.utilities.queries import add_query_headers
+from restapi.rest.encoders import binary_formats, get_binary_input
+from restapi.rest.compression import compress_response
+from restapi.utilities.sampler import sampler, CONTINUOUS_PROFILER
+from restapi.utilities.logs import log, access_log, access_log_parameters, init_sentry
+from restapi.utilities.logs import requests_log, REQUESTS_LOG_PATH
+from restapi.utilities.logs import obfuscate_query_string, sample_access_log_parameters
 
 
 ########################
@@ -40,13 +47,19 @@ def create_app(
     if PRODUCTION and testing_mode:
         log.exit("Unable to execute tests in production")
 
+    boot_phases.clear()
+
     # Initialize reading of all files
-    mem.geo_reader = geolite2.reader()
-    # when to close??
-    # geolite2.close()
-    mem.customizer = Customizer(testing_mode)
+    # GeoIP database is opened at first use (see BaseAuthentication.localize_ip)
+    mem.geo_reader = None
+    with boot_phase('configuration'):
+        mem.customizer = Customizer(testing_mode)
     if not init_mode:
-        mem.customizer.load_swagger()
+        with boot_phase('endpoints'):
+            mem.customizer.do_schema()
+            mem.customizer.find_endpoints()
+        with boot_phase('swagger'):
+            mem.customizer.do_swagger()
 
     # Add template dir for output in HTML
     kwargs['template_folder'] = os.path.join(ABS_RESTAPI_PATH, 'templates')
@@ -67,11 +80,20 @@ def create_app(
     elif worker_mode:
         skip_endpoint_mapping = True
 
+    # Metrics saved by the workers of a previous boot
+    if not skip_endpoint_mapping and not testing_mode:
+        metrics.clear()
+        if CONTINUOUS_PROFILER:
+            sampler.clear()
+            sampler.start()
+
     # Fix proxy wsgi for production calls
     microservice.wsgi_app = ProxyFix(microservice.wsgi_app)
 
     # CORS
     if not PRODUCTION:
+        from flask_cors import CORS
+
         cors = CORS(
             allow_headers=[
                 'Content-Type',
@@ -96,137 +118,202 @@ def create_app(
         log.info("Production server mode is ON")
 
     # Find services and try to connect to the ones available
-    connectors = detector.init_services(
-        app=microservice,
-        worker_mode=worker_mode,
-        project_init=init_mode,
-        project_clean=destroy_mode,
-    )
+    with boot_phase('services'):
+        connectors = detector.init_services(
+            app=microservice,
+            worker_mode=worker_mode,
+            project_init=init_mode,
+            project_clean=destroy_mode,
+        )
 
     if worker_mode:
         microservice.connectors = connectors
 
     # Restful plugin
     if not skip_endpoint_mapping:
-        # Triggering automatic mapping of REST endpoints
-        rest_api = Api(catch_all_404s=True)
-
-        # Basic configuration (simple): from example class
-        if len(mem.customizer._endpoints) < 1:
-            log.error("No endpoints found!")
+        with boot_phase('mapping'):
+            # Triggering automatic mapping of REST endpoints
+            rest_api = Api(catch_all_404s=True)
 
-            raise AttributeError("Follow the docs and define your endpoints")
+            # Basic configuration (simple): from example class
+            if len(mem.customizer._endpoints) < 1:
+                log.error("No endpoints found!")
 
-        for resource in mem.customizer._endpoints:
-            # urls = [uri for _, uri in resource.uris.items()]
-            urls = list(resource.uris.values())
+                raise AttributeError("Follow the docs and define your endpoints")
 
-            # Create the restful resource with it;
-            # this method is from RESTful plugin
-            rest_api.add_resource(resource.cls, *urls)
+            for resource in mem.customizer._endpoints:
+                # urls = [uri for _, uri in resource.uris.items()]
+                urls = list(resource.uris.values())
 
-            log.verbose("Map '{}' to {}", resource.cls.__name__, urls)
+                # Create the restful resource with it;
+                # this method is from RESTful plugin
+                rest_api.add_resource(resource.cls, *urls)
+
+                log.verbose("Map '{}' to {}", resource.cls.__name__, urls)
+
+            # Enable all schema endpoints to be mapped with this extra step
+            if len(mem.customizer._schema_endpoint.uris) > 0:
+                log.debug("Found one or more schema to expose")
+                urls = [uri for _, uri in mem.customizer._schema_endpoint.uris.items()]
+                rest_api.add_resource(mem.customizer._schema_endpoint.cls, *urls)
+
+            # HERE all endpoints will be registered by using FlaskRestful
+            rest_api.init_app(microservice)
+
+            microservice.services_instances = {}
+            for m in detector.services_classes:
+                ExtClass = detector.services_classes.get(m)
+                microservice.services_instances[m] = ExtClass(microservice)
+
+        with boot_phase('apispec'):
+            # FlaskApiSpec experimentation
+            from apispec import APISpec
+            from flask_apispec import FlaskApiSpec
+            from apispec.ext.marshmallow import MarshmallowPlugin
+            # from apispec_webframeworks.flask import FlaskPlugin
+
+            microservice.config.update({
+                'APISPEC_SPEC': APISpec(
+                    title=get_project_configuration(
+                        'project.title', default='Your application name'
+                    ),
+                    version=get_project_configuration(
+                        'project.version', default='0.0.1'
+                    ),
+                    openapi_version="2.0",
+                    # OpenApi 3 not working with FlaskApiSpec
+                    # -> Duplicate parameter with name body and location body
+                    # https://github.com/jmcarp/flask-apispec/issues/170
+                    # Find other warning like this by searching:
+                    # **FASTAPI**
+                    # openapi_version="3.0.2",
+                    plugins=[
+                        MarshmallowPlugin()
+                    ],
+                ),
+                'APISPEC_SWAGGER_URL': '/api/swagger',
+                # 'APISPEC_SWAGGER_UI_URL': '/api/swagger-ui',
+                # Disable Swagger-UI
+                'APISPEC_SWAGGER_UI_URL': None,
+            })
+            docs = FlaskApiSpec(microservice)
+
+            with microservice.app_context():
+                for resource in mem.customizer._endpoints:
+                    urls = list(resource.uris.values())
+                    try:
+                        docs.register(resource.cls)
+                    except TypeError as e:
+                        # log.warning("{} on {}", type(e), resource.cls)
+                        # Enable this warning to start conversion to FlaskFastApi
+                        # Find other warning like this by searching:
+                        # **FASTAPI**
+                        log.verbose("{} on {}", type(e), resource.cls)
 
-        # Enable all schema endpoints to be mapped with this extra step
-        if len(mem.customizer._schema_endpoint.uris) > 0:
-            log.debug("Found one or more schema to expose")
-            urls = [uri for _, uri in mem.customizer._schema_endpoint.uris.items()]
-            rest_api.add_resource(mem.customizer._schema_endpoint.cls, *urls)
+    # Connections opened so far are rebuilt in workers forked from this process
+    detector.register_fork_hooks(microservice)
 
-        # HERE all endpoints will be registered by using FlaskRestful
-        rest_api.init_app(microservice)
+    # Clean app routes
+    with boot_phase('routes'):
+        ignore_verbs = {"HEAD", "OPTIONS"}
 
-        microservice.services_instances = {}
-        for m in detector.services_classes:
-            ExtClass = detector.services_classes.get(m)
-            microservice.services_instances[m] = ExtClass(microservice)
+        for rule in microservice.url_map.iter_rules():
 
-        # FlaskApiSpec experimentation
-        from apispec import APISpec
-        from flask_apispec import FlaskApiSpec
-        from apispec.ext.marshmallow import MarshmallowPlugin
-        # from apispec_webframeworks.flask import FlaskPlugin
+            rulename = str(rule)
+            # Skip rules that are only exposing schemas
+            if '/schemas/' in rulename:
+                continue
 
-        microservice.config.update({
-            'APISPEC_SPEC': APISpec(
-                title=get_project_configuration(
-                    'project.title', default='Your application name'
-                ),
-                version=get_project_configuration(
-                    'project.version', default='0.0.1'
-                ),
-                openapi_version="2.0",
-                # OpenApi 3 not working with FlaskApiSpec
-                # -> Duplicate parameter with name body and location body
-                # https://github.com/jmcarp/flask-apispec/issues/170
-                # Find other warning like this by searching:
-                # **FASTAPI**
-                # openapi_version="3.0.2",
-                plugins=[
-                    MarshmallowPlugin()
-                ],
-            ),
-            'APISPEC_SWAGGER_URL': '/api/swagger',
-            # 'APISPEC_SWAGGER_UI_URL': '/api/swagger-ui',
-            # Disable Swagger-UI
-            'APISPEC_SWAGGER_UI_URL': None,
-        })
-        docs = FlaskApiSpec(microservice)
-
-        with microservice.app_context():
-            for resource in mem.customizer._endpoints:
-                urls = list(resource.uris.values())
-                try:
-                    docs.register(resource.cls)
-                except TypeError as e:
-                    # log.warning("{} on {}", type(e), resource.cls)
-                    # Enable this warning to start conversion to FlaskFastApi
-                    # Find other warning like this by searching:
-                    # **FASTAPI**
-                    log.verbose("{} on {}", type(e), resource.cls)
+            endpoint = microservice.view_functions[rule.endpoint]
+            if not hasattr(endpoint, 'view_class'):
+                continue
+            newmethods = ignore_verbs.copy()
 
-    # Clean app routes
-    ignore_verbs = {"HEAD", "OPTIONS"}
-
-    for rule in microservice.url_map.iter_rules():
-
-        rulename = str(rule)
-        # Skip rules that are only exposing schemas
-        if '/schemas/' in rulename:
-            continue
-
-        endpoint = microservice.view_functions[rule.endpoint]
-        if not hasattr(endpoint, 'view_class'):
-            continue
-        newmethods = ignore_verbs.copy()
-
-        for verb in rule.methods - ignore_verbs:
-            method = verb.lower()
-            if method in mem.customizer._original_paths[rulename]:
-                # remove from flask mapping
-                # to allow 405 response
-                newmethods.add(verb)
-            else:
-                log.verbose("Removed method {}.{} from mapping", rulename, verb)
+            for verb in rule.methods - ignore_verbs:
+                method = verb.lower()
+                if method in mem.customizer._original_paths[rulename]:
+                    # remove from flask mapping
+                    # to allow 405 response
+                    newmethods.add(verb)
+                else:
+                    log.verbose("Removed method {}.{} from mapping", rulename, verb)
 
-        rule.methods = newmethods
+            rule.methods = newmethods
 
     # marshmallow errors handler
     @microservice.errorhandler(422)
     def handle_marshmallow_errors(error):
         return (error.data.get("messages"), 400, {})
 
+    # Version headers do not change while the app is running
+    version_headers = {"_RV": str(__version__)}
+    PROJECT_VERSION = get_project_configuration("project.version", default=None)
+    if PROJECT_VERSION is not None:
+        version_headers["Version"] = str(PROJECT_VERSION)
+
+    @microservice.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        metrics.add('restapi_http_requests_in_flight')
+        if sampler.started:
+            route = request.url_rule.rule if request.url_rule is not None else None
+            name = re.sub(
+                r'[^A-Za-z0-9_.]', '_', "{}.{}".format(request.endpoint, request.method)
+            )
+            sampler.begin_request(route, name)
+
+    # Also called when the request fails before reaching after_request
+    @microservice.teardown_request
+    def stop_request_timer(exception=None):
+        metrics.add('restapi_http_requests_in_flight', value=-1)
+        metrics.save()
+        if sampler.started:
+            sampler.end_request()
+
+    def collect_request_metrics(response, route, duration):
+        status = response.status_code
+        metrics.inc(
+            'restapi_http_requests_total',
+            (('method', request.method), ('route', route), ('status', status)),
+        )
+        metrics.observe(
+            'restapi_http_request_duration_seconds',
+            (('method', request.method), ('route', route)),
+            duration,
+        )
+        if status >= 400:
+            metrics.inc('restapi_http_errors_total', (('status', status),))
+
+    def log_request_metrics(response, route, duration):
+
+        if duration is not None:
+            duration = int(duration * 1000000)
+        # streamed responses have no known length
+        size = response.calculate_content_length()
+
+        requests_log.bind(
+            method=request.method,
+            route=route,
+            status=response.status_code,
+            duration_us=duration,
+            bytes=size,
+            queries=g.get('db_queries', 0),
+            user_id=g.get('user_id'),
+        ).info("{} {} {}", request.method, route, response.status_code)
+
+    # Registered before log_response, to be executed after it
+    @microservice.after_request
+    def compress(response):
+        return compress_response(request, response)
+
     # Logging responses
     @microservice.after_request
     def log_response(response):
 
-        response.headers["_RV"] = str(__version__)
-
-        PROJECT_VERSION = get_project_configuration(
-            "project.version", default=None
-        )
-        if PROJECT_VERSION is not None:
-            response.headers["Version"] = str(PROJECT_VERSION)
+        for header, value in version_headers.items():
+            response.headers[header] = value
+        if not PRODUCTION:
+            add_query_headers(response)
         # NOTE: if it is an upload,
         # I must NOT consume request.data or request.json,
         # otherwise the content gets lost
@@ -234,64 +321,53 @@ def create_app(
 
         if request.mimetype in do_not_log_types:
             data = 'STREAM_UPLOAD'
+        elif not sample_access_log_parameters(response.status_code):
+            data = '-'
         else:
             try:
-                data = handle_log_output(request.data)
-                # Limit the parameters string size, sometimes it's too big
-                for k in data:
-                    try:
-                        if isinstance(data[k], dict):
-                            for kk in data[k]:
-                                v = str(data[k][kk])
-                                if len(v) > MAX_CHAR_LEN:
-                                    v = v[:MAX_CHAR_LEN] + "..."
-                                data[k][kk] = v
-                            continue
-
-                        if not isinstance(data[k], str):
-                            data[k] = str(data[k])
-
-                        if len(data[k]) > MAX_CHAR_LEN:
-                            data[k] = data[k][:MAX_CHAR_LEN] + "..."
-                    except IndexError:
-                        pass
+                # input already parsed by the endpoint is cached in the request
+                if request.mimetype == 'application/x-www-form-urlencoded':
+                    parameters = request.form.to_dict()
+                elif request.mimetype in binary_formats:
+                    parameters = get_binary_input(request)
+                else:
+                    parameters = request.get_json(force=True, silent=True)
+                data = access_log_parameters(parameters or {})
             except Exception:
                 data = 'OTHER_UPLOAD'
 
         # Obfuscating query parameters
-        url = urllib_parse.urlparse(request.url)
-        try:
-            params = urllib_parse.unquote(
-                urllib_parse.urlencode(handle_log_output(url.query))
-            )
-            url = url._replace(query=params)
-        except TypeError:
-            log.error("Unable to url encode the following parameters:")
-            print(url.query)
+        url = request.base_url
+        if request.query_string:
+            # the query string is not guaranteed to be valid utf-8
+            query = request.query_string.decode('utf-8', 'replace')
+            query = obfuscate_query_string(query)
+            url = "{}?{}".format(url, query)
 
-        url = urllib_parse.urlunparse(url)
-        log.info("{} {} {} {}", request.method, url, data, response)
+        access_log.info("{} {} {} {}", request.method, url, data, response)
+
+        route = request.url_rule.rule if request.url_rule is not None else None
+        start = g.get('request_start')
+        duration = None if start is None else time.perf_counter() - start
+
+        if duration is not None:
+            collect_request_metrics(response, route, duration)
+
+        if REQUESTS_LOG_PATH:
+            log_request_metrics(response, route, duration)
 
         return response
 
     if send_mail_is_active():
-        if not test_smtp_client():
-            log.critical("Bad SMTP configuration, unable to create a client")
-        else:
-            log.info("SMTP configuration verified")
+        with boot_phase('smtp'):
+            if not test_smtp_client():
+                log.critical("Bad SMTP configuration, unable to create a client")
+            else:
+                log.info("SMTP configuration verified")
     # and the flask App is ready now:
     log.info("Boot completed")
 
-    if SENTRY_URL is not None:
-
-        if not PRODUCTION:
-            log.info("Skipping Sentry, only enabled in PRODUCTION mode")
-        else:
-            import sentry_sdk
-            from sentry_sdk.integrations.flask import FlaskIntegration
-
-            sentry_sdk.init(dsn=SENTRY_URL, integrations=[FlaskIntegration()])
-            log.info("Enabled Sentry {}", SENTRY_URL)
+    init_sentry()
 
     # return our flask app
     return microservice
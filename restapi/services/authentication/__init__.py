@@ -14,7 +14,7 @@ import pytz
 
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from flask import current_app, request
+from flask import current_app, request, g, has_request_context
 
 from restapi.services.detect import Detector
 from restapi.confs import PRODUCTION, CUSTOM_PACKAGE, get_project_configuration
@@ -252,6 +252,13 @@ class BaseAuthentication(metaclass=abc.ABCMeta):
     def localize_ip(ip):
 
         try:
+            if getattr(mem, 'geo_reader', None) is None:
+                from geolite2 import geolite2
+
+                # when to close??
+                # geolite2.close()
+                mem.geo_reader = geolite2.reader()
+
             data = mem.geo_reader.get(ip)
 
             if data is None:
@@ -400,6 +407,9 @@ class BaseAuthentication(metaclass=abc.ABCMeta):
 
         self._token = token
         self._jti = payload['jti']
+        # Exposed to the request logs
+        if has_request_context():
+            g.user_id = payload.get('user_id')
         return True
 
     def save_token(self, user, token, jti, token_type=None):
@@ -152,6 +152,8 @@ class HTTPTokenAuth:
 
                 return func(*args, **kwargs)
 
+            # checked by the decorators that have to be applied below this one
+            wrapper.auth_required = True
             return wrapper
 
         return decorator
@@ -29,6 +29,7 @@ class Detector:
         self.services_classes = {}
         self.connectors_instances = {}
         self.available_services = {}
+        self.fork_app = None
         self.meta = Meta()
         self.check_configuration()
         self.load_classes()
@@ -221,12 +222,37 @@ class Detector:
 
         return self.services_classes
 
+    def get_required_services(self, services):
+        """
+        The given services, with the backend required by the authentication
+        """
+
+        services = list(services)
+        if (
+            self.authentication_name in services
+            and self.authentication_service is not None
+            and self.authentication_service not in services
+        ):
+            log.info(
+                "Enabling {}, required by the authentication",
+                self.authentication_service
+            )
+            services.append(self.authentication_service)
+        return services
+
     def init_services(
-        self, app, worker_mode=False, project_init=False, project_clean=False
+        self, app, worker_mode=False, project_init=False, project_clean=False,
+        services=None
     ):
+        """
+        Initialize connectors of all available services,
+        or only the ones listed in services, if provided
+        """
 
         instances = {}
         auth_backend = None
+        if services is not None:
+            services = self.get_required_services(services)
 
         for service in self.services_configuration:
 
@@ -235,6 +261,10 @@ class Detector:
             if not self.available_services.get(name):
                 continue
 
+            if services is not None and name not in services:
+                log.verbose("Skipping {} connector", name)
+                continue
+
             if name == self.authentication_name and auth_backend is None:
                 if self.authentication_service is None:
                     log.warning("No authentication")
@@ -301,6 +331,40 @@ class Detector:
 
         return self.connectors_instances
 
+    def post_fork(self, app=None):
+        """
+        Rebuild native connections in a forked child (e.g. preforked workers),
+        everything else created by the parent is kept as is (copy-on-write)
+        """
+
+        instances = list(self.connectors_instances.values())
+        if app is not None:
+            instances.extend(getattr(app, 'services_instances', {}).values())
+
+        for instance in instances:
+            instance.post_fork()
+
+        log.debug("Connectors ready in process {}", os.getpid())
+
+    def register_fork_hooks(self, app):
+
+        # hooks cannot be unregistered: install them once, bound to the last app
+        already_registered = self.fork_app is not None
+        self.fork_app = app
+        if already_registered:
+            return
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=lambda: self.post_fork(self.fork_app))
+
+        # uWSGI forks its workers from C, python hooks are not executed
+        try:
+            from uwsgidecorators import postfork
+        except ImportError:
+            pass
+        else:
+            postfork(lambda: self.post_fork(self.fork_app))
+
     def check_availability(self, name):
 
         if '.' in name:
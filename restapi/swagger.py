@@ -9,16 +9,15 @@ https://raw.githubusercontent.com/gangverk/flask-swagger/master/flask_swagger.py
 
 import re
 import os
-import tempfile
 import json
-from bravado_core.spec import Spec
-from bravado_core.validate import validate_object
+import hashlib
 
 from restapi.confs import PRODUCTION, ABS_RESTAPI_PATH, MODELS_DIR
 from restapi.confs import CUSTOM_PACKAGE, EXTENDED_PACKAGE, EXTENDED_PROJECT_DISABLED
 from restapi.confs import get_project_configuration
 from restapi.confs.attributes import ExtraAttributes
 from restapi.utilities.globals import mem
+from restapi.utilities.cache import read_cache_file, save_cache_file
 from restapi.utilities.configuration import load_yaml_file, mix
 from restapi.utilities.logs import log
 
@@ -27,6 +26,8 @@ JSON_APPLICATION = 'application/json'
 
 def input_validation(json_parameters, definitionName):
 
+    from bravado_core.validate import validate_object
+
     definition = mem.customizer._definitions['definitions'][definitionName]
     spec = mem.customizer._validated_spec
 
@@ -393,32 +394,34 @@ class Swagger:
         m1 = mix(data, extended_models)
         return mix(m1, custom_models)
 
-    def validation(self, swag_dict):
+    def validation(self, swag_dict, use_cache=True):
         """
         Based on YELP library,
         verify the current definition on the open standard
+
+        A definition already validated by a previous boot (or by another
+        process) is not validated again: an empty marker named after the
+        checksum of the definition is saved in the cache. Only the validation
+        is skipped, the definition is still built and loaded at every boot
         """
 
         if len(swag_dict['paths']) < 1:
             raise AttributeError("Swagger 'paths' definition is empty")
 
-        filepath = os.path.join(tempfile.gettempdir(), 'test.json')
+        # Fix jsonschema validation problem
+        # expected string or bytes-like object
+        # http://j.mp/2hEquZy
+        serialized = json.dumps(swag_dict, sort_keys=True)
+        swag_dict = json.loads(serialized)
 
-        try:
-            # Fix jsonschema validation problem
-            # expected string or bytes-like object
-            # http://j.mp/2hEquZy
-            swag_dict = json.loads(json.dumps(swag_dict))
-            # write it down
-            # FIXME: can we do better than this?
-            with open(filepath, 'w') as f:
-                json.dump(swag_dict, f)
-        except Exception as e:
-            raise e
-            # log.warning("Failed to temporary save the swagger definition")
+        checksum = hashlib.sha256(serialized.encode()).hexdigest()
+        cache_name = 'swagger-{}.valid'.format(checksum)
+        is_cached = use_cache and read_cache_file(cache_name) is not None
+
+        from bravado_core.spec import Spec
 
         bravado_config = {
-            'validate_swagger_spec': True,
+            'validate_swagger_spec': not is_cached,
             'validate_requests': False,
             'validate_responses': False,
             'use_models': False,
@@ -428,13 +431,17 @@ class Swagger:
             self._customizer._validated_spec = Spec.from_dict(
                 swag_dict, config=bravado_config
             )
-            log.debug("Swagger configuration is validated")
         except Exception as e:
             # raise e
             error = str(e).split('\n')[0]
             log.error("Failed to validate:\n{}\n", error)
             return False
-        finally:
-            os.remove(filepath)
+
+        if is_cached:
+            log.debug("Swagger configuration already validated ({})", checksum)
+        else:
+            log.debug("Swagger configuration is validated")
+            if use_cache:
+                save_cache_file(cache_name, '')
 
         return True
@@ -9,6 +9,7 @@ from glom import glom
 from restapi.confs import DEFAULT_HOST, DEFAULT_PORT, API_URL, AUTH_URL
 from restapi.services.authentication import BaseAuthentication
 from restapi.utilities.htmlcodes import hcodes
+from restapi.utilities.queries import QUERY_COUNT_HEADER, QUERY_REPEATED_HEADER
 
 from restapi.utilities.logs import log
 
@@ -387,6 +388,29 @@ class BaseTests:
 
         return True
 
+    @staticmethod
+    def check_query_budget(response, budget, request=''):
+        """
+            Fail if the response required more queries than the given budget
+            or if the same query has been repeated too many times (N+1)
+        """
+        if budget is None:
+            return
+
+        queries = int(response.headers.get(QUERY_COUNT_HEADER, 0))
+        if queries > budget:
+            pytest.fail(
+                "{} executed {} queries, budget is {} ({})".format(
+                    request, queries, budget,
+                    response.headers.get('{}-Details'.format(QUERY_COUNT_HEADER))
+                )
+            )
+        repeated = response.headers.get(QUERY_REPEATED_HEADER)
+        if repeated is not None:
+            pytest.fail(
+                "{} repeated {} queries, possible N+1".format(request, repeated)
+            )
+
     def _test_endpoint(
         self,
         client,
@@ -397,7 +421,20 @@ class BaseTests:
         put_status=None,
         del_status=None,
         post_data=None,
+        query_budget=None,
     ):
+        """
+            query_budget can be a number (applied to all methods)
+            or a dictionary like {'get': 5, 'post': 10}
+        """
+
+        if not isinstance(query_budget, dict):
+            query_budget = {
+                'get': query_budget,
+                'post': query_budget,
+                'put': query_budget,
+                'delete': query_budget,
+            }
 
         endpoint = "{}/{}".format(API_URI, endpoint)
 
@@ -424,17 +461,29 @@ class BaseTests:
         if get_status is not None:
             get_r = client.get(endpoint, headers=headers)
             assert get_r.status_code == get_status
+            self.check_query_budget(
+                get_r, query_budget.get('get'), 'GET {}'.format(endpoint)
+            )
 
         if post_status is not None:
             post_r = client.post(endpoint, headers=headers, data=post_data)
             assert post_r.status_code == post_status
+            self.check_query_budget(
+                post_r, query_budget.get('post'), 'POST {}'.format(endpoint)
+            )
 
         if put_status is not None:
             put_r = client.put(endpoint, headers=headers)
             assert put_r.status_code == put_status
+            self.check_query_budget(
+                put_r, query_budget.get('put'), 'PUT {}'.format(endpoint)
+            )
 
         if del_status is not None:
             delete_r = client.delete(endpoint, headers=headers)
             assert delete_r.status_code == del_status
+            self.check_query_budget(
+                delete_r, query_budget.get('delete'), 'DELETE {}'.format(endpoint)
+            )
 
         return get_r, post_r, put_r, delete_r
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+"""
+Timing (and memory, if tracemalloc is tracing) of the boot phases
+"""
+
+import tracemalloc
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+from restapi.utilities.logs import log
+
+# phase name -> (seconds, allocated bytes or None)
+boot_phases = {}
+
+
+def get_traced_memory():
+    if not tracemalloc.is_tracing():
+        return None
+    current, _ = tracemalloc.get_traced_memory()
+    return current
+
+
+@contextmanager
+def boot_phase(name):
+
+    memory = get_traced_memory()
+    start = timer()
+    try:
+        yield
+    finally:
+        elapsed = timer() - start
+        if memory is not None:
+            memory = get_traced_memory() - memory
+        boot_phases[name] = (elapsed, memory)
+        log.verbose("Boot phase '{}' completed in {:.3f}s", name, elapsed)
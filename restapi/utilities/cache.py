@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""
+Files computed at boot time and shared with the following boots
+and with the other processes (workers), stored in CACHE_PATH
+
+The folder is only used when owned by the current user and not writable by
+others: files planted by another local user are never read
+"""
+
+import os
+import stat
+import tempfile
+
+from restapi.confs import CACHE_PATH
+from restapi.utilities.logs import log
+
+
+def get_cache_file(filename):
+    return os.path.join(CACHE_PATH, filename)
+
+
+def is_cache_path_safe():
+
+    try:
+        # lstat: a symlink to a folder of another user is not followed
+        info = os.lstat(CACHE_PATH)
+    except OSError:
+        return False
+
+    if not stat.S_ISDIR(info.st_mode):
+        log.warning("Cache disabled, {} is not a folder", CACHE_PATH)
+        return False
+    if info.st_uid != os.getuid():
+        log.warning("Cache disabled, {} is owned by another user", CACHE_PATH)
+        return False
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        log.warning("Cache disabled, {} is writable by others", CACHE_PATH)
+        return False
+    return True
+
+
+def read_cache_file(filename, binary=False):
+    """ Return the cached content, None if not available """
+
+    if not is_cache_path_safe():
+        return None
+
+    try:
+        with open(get_cache_file(filename), 'rb' if binary else 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def save_cache_file(filename, content, binary=False):
+
+    try:
+        os.makedirs(CACHE_PATH, mode=0o700, exist_ok=True)
+        # exist_ok: the folder could have been created by someone else
+        if not is_cache_path_safe():
+            return
+        # write and rename, to never expose a partial file to other processes
+        fd, tmppath = tempfile.mkstemp(dir=CACHE_PATH)
+        with os.fdopen(fd, 'wb' if binary else 'w') as f:
+            f.write(content)
+        os.replace(tmppath, get_cache_file(filename))
+    except OSError as e:
+        log.warning("Unable to save {} in cache: {}", filename, e)
@@ -1,21 +1,98 @@
 # -*- coding: utf-8 -*-
 
 import os
+import json
+import hashlib
 from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
 import yaml
+from restapi.utilities.cache import read_cache_file, save_cache_file
 from restapi.utilities.logs import log
 
+# LibYAML bindings are much faster, when available
+try:
+    from yaml import CSafeLoader as SafeLoader, CLoader as Loader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader, Loader
+
 
 PROJECTS_DEFAULTS_FILE = 'projects_defaults.yaml'
 PROJECT_CONF_FILENAME = 'project_configuration.yaml'
 
 
+def dump_cached(content):
+    """
+    JSON of the content to be cached, None if it would not be loaded back
+    unchanged (e.g. YAML dates or non-string keys)
+    """
+
+    try:
+        serialized = json.dumps(content)
+    except (TypeError, ValueError):
+        return None
+    if json.loads(serialized) != content:
+        return None
+    return serialized
+
+
+def load_cached(serialized):
+    return json.loads(serialized, object_pairs_hook=OrderedDict)
+
+
+def get_file_signature(filepath):
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return [filepath, stat.st_mtime_ns, stat.st_size]
+
+
 def read_configuration(
         default_file_path, base_project_path, projects_path, submodules_path):
     """
     Read default configuration
+
+    The merged result is cached, keyed on arguments and mtimes of all files
+    that could be involved, to skip both parsing and merging at next boots
     """
 
+    extend_file = "extended_{}".format(PROJECT_CONF_FILENAME)
+    signature = [
+        default_file_path, base_project_path, projects_path, submodules_path
+    ]
+    for path, filename in [
+        (base_project_path, PROJECT_CONF_FILENAME),
+        (default_file_path, PROJECTS_DEFAULTS_FILE),
+        (projects_path, extend_file),
+        (submodules_path, extend_file),
+    ]:
+        if path is not None:
+            signature.append(get_file_signature(os.path.join(path, filename)))
+
+    checksum = hashlib.sha256(repr(signature).encode()).hexdigest()
+    cache_name = 'configuration-{}.json'.format(checksum)
+
+    cached = read_cache_file(cache_name)
+    if cached is not None:
+        try:
+            configuration, extended_project, extend_path = load_cached(cached)
+            return configuration, extended_project, extend_path
+        except (ValueError, TypeError) as e:
+            log.warning("Invalid cached configuration: {}", e)
+
+    configuration = read_configuration_files(
+        default_file_path, base_project_path, projects_path, submodules_path
+    )
+    serialized = dump_cached(list(configuration))
+    if serialized is not None:
+        save_cache_file(cache_name, serialized)
+    return configuration
+
+
+def read_configuration_files(
+        default_file_path, base_project_path, projects_path, submodules_path):
+
     custom_configuration = load_yaml_file(
         PROJECT_CONF_FILENAME, path=base_project_path, keep_order=True
     )
@@ -100,7 +177,7 @@ def mix(base, custom):
     return base
 
 
-class OrderedLoader(yaml.SafeLoader):
+class OrderedLoader(SafeLoader):
     """
     A 'workaround' good enough for ordered loading of dictionaries
 
@@ -119,6 +196,12 @@ def construct_mapping(loader, node):
     return OrderedDict(loader.construct_pairs(node))
 
 
+OrderedLoader.add_constructor(
+    yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+    construct_mapping
+)
+
+
 def load_yaml_file(file, path, keep_order=False):
 
     filepath = os.path.join(path, file)
@@ -128,28 +211,68 @@ def load_yaml_file(file, path, keep_order=False):
     if not os.path.exists(filepath):
         raise AttributeError("YAML file does not exist: {}".format(filepath))
 
-    with open(filepath) as fh:
+    with open(filepath, 'rb') as fh:
+        content = fh.read()
+
+    # parsed documents are cached, keyed on the file content
+    checksum = hashlib.sha256(content).hexdigest()
+    cache_name = 'yaml-{}-{}.json'.format(checksum, int(keep_order))
+    cached = read_cache_file(cache_name)
+    if cached is not None:
         try:
-            if keep_order:
+            return load_cached(cached)
+        except ValueError as e:
+            log.warning("Invalid cached file {}: {}", filepath, e)
+
+    try:
+        if keep_order:
+            loader = yaml.load_all(content, OrderedLoader)
+        else:
+            loader = yaml.load_all(content, Loader)
+
+        docs = list(loader)
 
-                OrderedLoader.add_constructor(
-                    yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
-                    construct_mapping
-                )
-                loader = yaml.load_all(fh, OrderedLoader)
-            else:
-                loader = yaml.load_all(fh, yaml.loader.Loader)
+        if len(docs) == 0:
+            raise AttributeError("YAML file is empty: {}".format(filepath))
 
-            docs = list(loader)
+        serialized = dump_cached(docs[0])
+        if serialized is not None:
+            save_cache_file(cache_name, serialized)
+        return docs[0]
 
-            if len(docs) == 0:
-                raise AttributeError("YAML file is empty: {}".format(filepath))
+    except Exception as e:
+        # # IF dealing with a strange exception string (escaped)
+        # import codecs
+        # error, _ = codecs.getdecoder("unicode_escape")(str(error))
+
+        raise AttributeError("Failed to read file {}: {}".format(filepath, e))
+
+
+def freeze(element):
+    """ Read-only copy of a configuration element """
+
+    if isinstance(element, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in element.items()})
+    if isinstance(element, (list, tuple)):
+        return tuple(freeze(e) for e in element)
+    return element
+
+
+def get_configuration_snapshot(configuration):
+    """
+    Immutable and flattened copy of the configuration,
+    with all (nested) keys addressed by their dotted path, e.g.:
+    snapshot['project.version'] instead of configuration['project']['version']
+    """
 
-            return docs[0]
+    snapshot = {}
 
-        except Exception as e:
-            # # IF dealing with a strange exception string (escaped)
-            # import codecs
-            # error, _ = codecs.getdecoder("unicode_escape")(str(error))
+    def index(prefix, element):
+        for key, value in element.items():
+            dotted_key = "{}{}".format(prefix, key)
+            snapshot[dotted_key] = value
+            if isinstance(value, Mapping):
+                index("{}.".format(dotted_key), value)
 
-            raise AttributeError("Failed to read file {}: {}".format(filepath, e))
+    index("", freeze(configuration))
+    return MappingProxyType(snapshot)
@@ -5,7 +5,8 @@ import sys
 import json
 import urllib
 import re
-from restapi.confs import PRODUCTION
+import random
+from restapi.confs import PRODUCTION, SENTRY_URL
 
 try:
     from loguru import logger as log
@@ -65,9 +66,21 @@ log.remove()
 
 # Prevent exceptions on standard sink
 def print_message_on_stderr(record):
+    if record["extra"].get("access", False):
+        return False
+    if record["extra"].get("request_metrics", False):
+        return False
     return record.get("exception") is None
 
 
+def is_access_log(record):
+    return record["extra"].get("access", False)
+
+
+def is_request_metrics(record):
+    return record["extra"].get("request_metrics", False)
+
+
 fmt = ""
 fmt += "<fg #FFF>{time:YYYY-MM-DD HH:mm:ss,SSS}</fg #FFF> "
 fmt += "[<level>{level}</level> "
@@ -89,6 +102,45 @@ log.add(
     filter=print_message_on_stderr
 )
 
+# Access logs (one per request) pass through a queue consumed by a thread,
+# logging calls are non-blocking for the request
+log.add(
+    sys.stderr,
+    level=log_level,
+    colorize=True,
+    format=fmt,
+    backtrace=False,
+    diagnose=False,
+    enqueue=True,
+    filter=is_access_log,
+)
+access_log = log.bind(access=True)
+
+# Optional JSON-lines sink with one record per request (method, route, status,
+# duration, size, queries, user) to be used for offline latency analysis
+REQUESTS_LOG_PATH = os.environ.get("REQUESTS_LOG_PATH")
+requests_log = log.bind(request_metrics=True)
+
+if REQUESTS_LOG_PATH:
+    try:
+        log.add(
+            REQUESTS_LOG_PATH,
+            level="INFO",
+            rotation="1 day",
+            retention="4 weeks",
+            # Each line is the json serialization of the record, fields in extra
+            serialize=True,
+            # Only plain values are bound to these records, pickle is always safe
+            enqueue=True,
+            backtrace=False,
+            diagnose=False,
+            catch=True,
+            filter=is_request_metrics,
+        )
+    except PermissionError as p:
+        log.error(p)
+        REQUESTS_LOG_PATH = None
+
 if LOGS_PATH is not None:
     try:
         log.add(
@@ -122,7 +174,7 @@ if LOGS_PATH is not None:
 
 MAX_CHAR_LEN = 200
 OBSCURE_VALUE = '****'
-OBSCURED_FIELDS = [
+OBSCURED_FIELDS = frozenset([
     'password',
     'pwd',
     'token',
@@ -131,7 +183,60 @@ OBSCURED_FIELDS = [
     'filename',
     'new_password',
     'password_confirm',
-]
+])
+
+
+# Fraction of successful requests logged with their parameters (errors always are)
+try:
+    ACCESS_LOG_SAMPLE_RATE = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', 1))
+except ValueError:
+    ACCESS_LOG_SAMPLE_RATE = 1.0
+
+# field=value pairs to be obfuscated in a raw (urlencoded) query string
+OBSCURED_QUERY_PATTERN = re.compile(
+    r'(^|&)({})=[^&]*'.format('|'.join(re.escape(f) for f in OBSCURED_FIELDS))
+)
+
+
+def sample_access_log_parameters(status_code):
+    if status_code >= 400 or ACCESS_LOG_SAMPLE_RATE >= 1:
+        return True
+    return random.random() < ACCESS_LOG_SAMPLE_RATE
+
+
+def obfuscate_query_string(query_string):
+    query_string = OBSCURED_QUERY_PATTERN.sub(
+        r'\1\2={}'.format(OBSCURE_VALUE), query_string
+    )
+    return urllib.parse.unquote(query_string)
+
+
+def truncate_value(value):
+    if not isinstance(value, str):
+        value = str(value)
+    if len(value) > MAX_CHAR_LEN:
+        value = value[:MAX_CHAR_LEN] + "..."
+    return value
+
+
+def access_log_parameters(parameters):
+    """ Obfuscate and truncate parameters in a single pass """
+
+    if not isinstance(parameters, dict):
+        return truncate_value(parameters)
+
+    output = {}
+    for key, value in parameters.items():
+        if key in OBSCURED_FIELDS:
+            output[key] = OBSCURE_VALUE
+        elif isinstance(value, dict):
+            output[key] = {
+                k: OBSCURE_VALUE if k in OBSCURED_FIELDS else truncate_value(v)
+                for k, v in value.items()
+            }
+        else:
+            output[key] = truncate_value(value)
+    return output
 
 
 # def re_obscure_pattern(string):
@@ -205,3 +310,26 @@ def obfuscate_dict(parameters, urlencoded=False):
         output[key] = value
 
     return output
+
+
+def init_sentry(celery=False):
+    """ Errors reporting, shared by the server and the celery workers """
+
+    if SENTRY_URL is None:
+        return
+
+    if not PRODUCTION:
+        log.info("Skipping Sentry, only enabled in PRODUCTION mode")
+        return
+
+    import sentry_sdk
+    from sentry_sdk.integrations.flask import FlaskIntegration
+
+    integrations = [FlaskIntegration()]
+    if celery:
+        from sentry_sdk.integrations.celery import CeleryIntegration
+
+        integrations.append(CeleryIntegration())
+
+    sentry_sdk.init(dsn=SENTRY_URL, integrations=integrations)
+    log.info("Enabled Sentry {}", SENTRY_URL)
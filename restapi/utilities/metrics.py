@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+
+"""
+Numeric telemetry exposed in the Prometheus text format.
+
+Every process collects its own counters, gauges and histograms in memory
+and periodically saves them in CACHE_PATH (metrics-<pid>.json).
+The process serving the metrics endpoint merges the files of all workers:
+counters and histograms are summed (dead workers included, to keep them
+monotonic), gauges are only summed over the processes still alive.
+Files of dead workers (e.g. recycled by --max-requests) are merged into a
+single metrics-retired.json, so that they do not pile up and are never
+overwritten by a new process with the same pid.
+"""
+
+import os
+import json
+import glob
+import fcntl
+import atexit
+import ipaddress
+import threading
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+import psutil
+
+from restapi.utilities.cache import get_cache_file, save_cache_file
+from restapi.utilities.cache import is_cache_path_safe
+from restapi.utilities.logs import log
+
+# Seconds between two saves of the metrics of a process
+METRICS_SAVE_INTERVAL = 1.0
+# Counters and histograms of the processes no longer alive
+RETIRED = "metrics-retired.json"
+# Prometheus default buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_ALLOWED_NETWORKS = [
+    ipaddress.ip_network(net.strip())
+    for net in os.environ.get(
+        'METRICS_ALLOWED_NETWORKS',
+        '127.0.0.0/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,::1/128',
+    ).split(',')
+    if net.strip()
+]
+
+HELP = {
+    'restapi_http_requests_total': 'Requests by method, route and status',
+    'restapi_http_request_duration_seconds': 'Request latency by method and route',
+    'restapi_http_requests_in_flight': 'Requests currently being served',
+    'restapi_http_errors_total': 'Error responses by status',
+    'restapi_connector_seconds': 'Time spent in Connector.get_instance',
+    'restapi_connector_connections_total': 'New connections by connector',
+}
+TYPES = {
+    'restapi_http_requests_total': 'counter',
+    'restapi_http_request_duration_seconds': 'histogram',
+    'restapi_http_requests_in_flight': 'gauge',
+    'restapi_http_errors_total': 'counter',
+    'restapi_connector_seconds': 'histogram',
+    'restapi_connector_connections_total': 'counter',
+}
+
+
+def is_allowed_address(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in net for net in METRICS_ALLOWED_NETWORKS)
+
+
+def is_allowed_request(request):
+    """
+    Both the peer connected to the server and the client forwarded by the
+    proxy (request.remote_addr, after ProxyFix) have to be allowed:
+    X-Forwarded-For alone can be sent by any client reaching the server
+    """
+
+    environ = request.environ
+    peer = environ.get('werkzeug.proxy_fix.orig', environ).get('REMOTE_ADDR')
+    return is_allowed_address(peer) and is_allowed_address(request.remote_addr)
+
+
+def merge_metrics(data, counters, histograms, gauges=None):
+
+    for name, labels, value in data.get('counters', []):
+        key = (name, tuple(tuple(lb) for lb in labels))
+        counters[key] = counters.get(key, 0) + value
+    if gauges is not None:
+        for name, labels, value in data.get('gauges', []):
+            key = (name, tuple(tuple(lb) for lb in labels))
+            gauges[key] = gauges.get(key, 0) + value
+    for name, labels, value in data.get('histograms', []):
+        key = (name, tuple(tuple(lb) for lb in labels))
+        hist = histograms.setdefault(key, [0] * len(value))
+        for i, v in enumerate(value):
+            hist[i] += v
+
+
+def read_metrics(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("Unable to read {}: {}", path, e)
+        return None
+
+
+@contextmanager
+def locked_metrics():
+    """
+    Serialize the processes retiring and reading the metrics files,
+    yields False if the cache folder is not usable
+    """
+
+    if not is_cache_path_safe():
+        yield False
+        return
+
+    try:
+        f = open(get_cache_file(RETIRED + '.lock'), 'a')
+    except OSError as e:
+        log.warning("Unable to lock the metrics: {}", e)
+        yield False
+        return
+
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    values = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        values.append('{}="{}"'.format(key, value.replace('\n', '\\n')))
+    return '{' + ','.join(values) + '}'
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # (name, labels) -> value, labels are tuples of (key, value)
+        self.counters = {}
+        self.gauges = {}
+        # (name, labels) -> [count per bucket..., count over the last bucket, sum]
+        self.histograms = {}
+        self.last_save = timer()
+        # the first save of a process retires the file of a dead one with its pid
+        self.saved = False
+        # saves delayed to the end of the interval, see save
+        self.pending_save = None
+
+    def post_fork(self):
+        # the lock could have been held by another thread of the parent
+        self.lock = threading.Lock()
+        self.reset()
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add(self, name, labels=(), value=1):
+        with self.lock:
+            key = (name, labels)
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            key = (name, labels)
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    hist[i] += 1
+                    break
+            else:
+                hist[len(BUCKETS)] += 1
+            hist[-1] += value
+
+    @staticmethod
+    def get_filename(pid=None):
+        return "metrics-{}.json".format(pid or os.getpid())
+
+    def dump(self):
+        with self.lock:
+            return json.dumps({
+                'counters': [[n, l, v] for (n, l), v in self.counters.items()],
+                'gauges': [[n, l, v] for (n, l), v in self.gauges.items()],
+                'histograms': [[n, l, v] for (n, l), v in self.histograms.items()],
+            })
+
+    def save(self, force=False):
+        """
+        Save the metrics of this process, at most once per METRICS_SAVE_INTERVAL:
+        within the interval the save is delayed to its end by a timer thread,
+        so that the metrics of an idle worker are never left unsaved
+        """
+
+        now = timer()
+        delay = self.last_save + METRICS_SAVE_INTERVAL - now
+        if not force and delay > 0:
+            self.schedule_save(delay)
+            return
+        self.last_save = now
+        if not self.counters and not self.gauges and not self.histograms:
+            return
+        if not self.saved:
+            # a file with the same pid was left by a dead process
+            with locked_metrics() as locked:
+                if locked:
+                    self.retire([self.get_path(os.getpid())])
+            self.saved = True
+        save_cache_file(self.get_filename(), self.dump())
+
+    def schedule_save(self, delay):
+
+        with self.lock:
+            if self.pending_save is not None:
+                return
+            self.pending_save = threading.Timer(delay, self.scheduled_save)
+            self.pending_save.daemon = True
+            self.pending_save.start()
+
+    def scheduled_save(self):
+
+        with self.lock:
+            self.pending_save = None
+        self.save(force=True)
+
+    def flush(self):
+        """ Save now, instead of at the end of the interval """
+
+        with self.lock:
+            pending, self.pending_save = self.pending_save, None
+        if pending is not None:
+            pending.cancel()
+        self.save(force=True)
+
+    @staticmethod
+    def get_path(pid):
+        return get_cache_file(Metrics.get_filename(pid))
+
+    @staticmethod
+    def clear():
+        """ Remove the metrics saved by a previous boot """
+        for path in glob.glob(Metrics.get_path('*')) + [get_cache_file(RETIRED)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.warning("Unable to remove {}: {}", path, e)
+
+    @staticmethod
+    def retire(paths):
+        """ Merge counters and histograms of dead processes in RETIRED """
+
+        paths = [p for p in paths if os.path.exists(p)]
+        if not paths:
+            return
+
+        counters = {}
+        histograms = {}
+        for path in paths + [get_cache_file(RETIRED)]:
+            if os.path.exists(path):
+                data = read_metrics(path)
+                if data is not None:
+                    merge_metrics(data, counters, histograms)
+
+        save_cache_file(RETIRED, json.dumps({
+            'counters': [[n, l, v] for (n, l), v in counters.items()],
+            'histograms': [[n, l, v] for (n, l), v in histograms.items()],
+        }))
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                log.warning("Unable to remove {}: {}", path, e)
+
+    def collect(self):
+        """ Merge the metrics saved by all the processes """
+
+        self.save(force=True)
+
+        counters = {}
+        gauges = {}
+        histograms = {}
+        with locked_metrics() as locked:
+            if not locked:
+                return counters, gauges, histograms
+
+            alive = []
+            dead = []
+            for path in glob.glob(self.get_path('*')):
+                pid = os.path.basename(path)[8:-5]
+                if not pid.isdigit():
+                    continue
+                if psutil.pid_exists(int(pid)):
+                    alive.append(path)
+                else:
+                    dead.append(path)
+            self.retire(dead)
+
+            for path in alive + [get_cache_file(RETIRED)]:
+                if not os.path.exists(path):
+                    continue
+                data = read_metrics(path)
+                if data is not None:
+                    merge_metrics(data, counters, histograms, gauges)
+
+        return counters, gauges, histograms
+
+    def render(self):
+        """ Metrics of all the processes in the Prometheus text format """
+
+        counters, gauges, histograms = self.collect()
+
+        families = {}
+        for (name, labels), value in list(counters.items()) + list(gauges.items()):
+            families.setdefault(name, []).append(
+                "{}{} {}".format(name, format_labels(labels), value)
+            )
+        for (name, labels), hist in histograms.items():
+            lines = families.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), hist):
+                cumulative += count
+                lines.append("{}_bucket{} {}".format(
+                    name, format_labels(labels + (('le', bound),)), cumulative
+                ))
+            lines.append("{}_sum{} {}".format(name, format_labels(labels), hist[-1]))
+            lines.append(
+                "{}_count{} {}".format(name, format_labels(labels), cumulative)
+            )
+
+        output = []
+        for name in sorted(families):
+            output.append("# HELP {} {}".format(name, HELP.get(name, name)))
+            output.append("# TYPE {} {}".format(name, TYPES.get(name, 'untyped')))
+            output.extend(families[name])
+        output.append('')
+        return '\n'.join(output)
+
+
+metrics = Metrics()
+
+# Each worker starts from an empty registry and saves it once more before exiting
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=metrics.post_fork)
+
+# uWSGI forks its workers from C, python hooks are not executed
+try:
+    from uwsgidecorators import postfork
+except ImportError:
+    pass
+else:
+    postfork(metrics.post_fork)
+
+atexit.register(metrics.flush)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+On-demand profiling of endpoint methods (see decorators.profile).
+
+A request is profiled when sampled by PROFILE_SAMPLE_RATE or when an admin
+sends the X-Profile header (cprofile or sampling). Profiles are saved in
+CACHE_PATH, shared by all the workers, and only the last
+PROFILES_BUFFER_SIZE are kept:
+    - cprofile: pstats file, to be loaded with pstats.Stats or snakeviz
+    - sampling: collapsed stacks, to be rendered by flamegraph.pl or speedscope
+"""
+
+import os
+import re
+import sys
+import glob
+import time
+import random
+import marshal
+import cProfile
+import threading
+from collections import Counter
+
+from restapi.utilities.cache import get_cache_file, read_cache_file, save_cache_file
+from restapi.utilities.logs import log
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_MODES = {'cprofile': 'prof', 'sampling': 'folded'}
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'cprofile')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILES_BUFFER_SIZE = int(os.environ.get('PROFILES_BUFFER_SIZE', 50))
+# Seconds between two samples of the stack
+SAMPLING_INTERVAL = float(os.environ.get('PROFILE_SAMPLING_INTERVAL', 0.005))
+
+PROFILE_ID = re.compile(r'^[0-9]+-[0-9]+-[A-Za-z0-9_.]+\.(prof|folded)$')
+
+
+def get_profile_mode(auth, default=None):
+    """ The profiler to be used for the current request, None if not sampled """
+
+    from flask import request
+
+    mode = request.headers.get(PROFILE_HEADER)
+    if mode is not None:
+        # Only admins can request a profile, others are silently ignored
+        if auth.get_user() is not None and auth.verify_admin():
+            return mode if mode in PROFILE_MODES else default or PROFILE_MODE
+        return None
+
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return default or PROFILE_MODE
+
+    return None
+
+
+def format_frame(frame):
+    code = frame.f_code
+    return "{}:{}".format(os.path.basename(code.co_filename), code.co_name)
+
+
+class StackSampler:
+    """ Statistical profiler: periodically samples the stack of a thread """
+
+    def __init__(self, thread_id=None, interval=SAMPLING_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(format_frame(frame))
+            frame = frame.f_back
+        if stack:
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.run, name="profiler-sampler", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def folded(self):
+        return ''.join(
+            "{} {}\n".format(stack, count) for stack, count in self.stacks.items()
+        )
+
+
+def run_profiled(mode, name, func, *args, **kwargs):
+
+    if mode == 'sampling':
+        profiler = StackSampler()
+        profiler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.stop()
+            save_profile(name, 'sampling', profiler.folded().encode())
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.create_stats()
+        save_profile(name, 'cprofile', marshal.dumps(profiler.stats))
+
+
+def list_profiles():
+    """ Saved profiles, from the newest """
+    files = glob.glob(get_cache_file('profile-*'))
+    return sorted(
+        (os.path.basename(f)[len('profile-'):] for f in files), reverse=True
+    )
+
+
+def save_profile(name, mode, content):
+
+    profile_id = "{}-{}-{}.{}".format(
+        time.time_ns(), os.getpid(), name, PROFILE_MODES[mode]
+    )
+    save_cache_file("profile-{}".format(profile_id), content, binary=True)
+    log.info("Saved profile {}", profile_id)
+
+    # Ring buffer: the oldest profiles are removed
+    for old_id in list_profiles()[PROFILES_BUFFER_SIZE:]:
+        try:
+            os.remove(get_cache_file("profile-{}".format(old_id)))
+        except OSError:
+            # already removed by another worker
+            pass
+
+
+def read_profile(profile_id):
+    """ Content of a saved profile, None if not found or invalid """
+    if not PROFILE_ID.match(profile_id):
+        return None
+    return read_cache_file("profile-{}".format(profile_id), binary=True)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+Count the queries (SQL statements, cypher calls, mongo commands and iRODS
+API calls) issued by the connectors while serving a request.
+The total is saved in flask.g (db_queries) and, in non-production mode,
+it is returned with the response headers, together with the queries
+repeated more than QUERY_REPEAT_THRESHOLD times (likely N+1 patterns)
+"""
+
+import os
+from flask import g, has_request_context
+
+from restapi.utilities.logs import log
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+QUERY_REPEATED_HEADER = 'X-Query-Repeated'
+QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', 5))
+
+
+def count_query(service, statement=None):
+
+    if not has_request_context():
+        return
+
+    g.db_queries = g.get('db_queries', 0) + 1
+
+    by_service = g.setdefault('db_queries_by_service', {})
+    by_service[service] = by_service.get(service, 0) + 1
+
+    if statement is not None:
+        statements = g.setdefault('db_statements', {})
+        key = (service, statement)
+        statements[key] = statements.get(key, 0) + 1
+
+
+def get_repeated_queries():
+    """ Queries executed more than QUERY_REPEAT_THRESHOLD times """
+    statements = g.get('db_statements', {})
+    return {
+        key: count for key, count in statements.items()
+        if count > QUERY_REPEAT_THRESHOLD
+    }
+
+
+def add_query_headers(response):
+
+    response.headers[QUERY_COUNT_HEADER] = str(g.get('db_queries', 0))
+
+    by_service = g.get('db_queries_by_service')
+    if by_service:
+        details = ', '.join(
+            '{}={}'.format(service, count) for service, count in by_service.items()
+        )
+        response.headers['{}-Details'.format(QUERY_COUNT_HEADER)] = details
+
+    repeated = get_repeated_queries()
+    if repeated:
+        for (service, statement), count in repeated.items():
+            log.warning(
+                "Possible N+1: {} query repeated {} times: {}",
+                service, count, statement
+            )
+        response.headers[QUERY_REPEATED_HEADER] = str(sum(repeated.values()))
+
+    return response
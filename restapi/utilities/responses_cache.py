@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cache of serialized GET responses, used by decorators.cache
+and invalidated by decorators.cache_invalidate.
+
+Backends (RESPONSE_CACHE_BACKEND):
+    - memory: in-process LRU (RESPONSE_CACHE_MAX_ENTRIES), each worker has its own
+    - redis: shared by all the workers, at RESPONSE_CACHE_URL
+
+Invalidation is based on tag versions: every key includes the current
+version of its tags, invalidating a tag changes its version so that
+previous entries are no longer reachable and simply expire.
+Tag versions are always shared by all the workers: with the memory backend
+they are saved in CACHE_PATH, so that an invalidation made by a worker
+also applies to the entries of the others
+"""
+
+import os
+import json
+import time
+import uuid
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+from restapi.utilities.cache import read_cache_file, save_cache_file
+from restapi.utilities.logs import log
+
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL', 'redis://localhost:6379/0')
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+KEY_PREFIX = 'restapi:cache:'
+TAG_PREFIX = 'restapi:tag:'
+# Request headers changing the response of a GET into a 304
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # key -> (expiration, value), in order of use
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expiration, value = entry
+            if expiration < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    @staticmethod
+    def get_tag_file(tag):
+        return "tag-{}".format(hashlib.sha1(tag.encode('utf-8')).hexdigest())
+
+    def get_versions(self, tags):
+        return [read_cache_file(self.get_tag_file(tag)) or '0' for tag in tags]
+
+    def invalidate(self, tags):
+        for tag in tags:
+            # a new unique version: concurrent invalidations are never lost
+            save_cache_file(self.get_tag_file(tag), uuid.uuid4().hex)
+
+
+class RedisBackend:
+    def __init__(self, url=RESPONSE_CACHE_URL):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        if value is None:
+            return None
+        try:
+            return self.loads(value)
+        except (ValueError, TypeError, KeyError) as e:
+            log.warning("Invalid cached response {}: {}", key, e)
+            return None
+
+    def set(self, key, value, ttl):
+        self.client.setex(key, ttl, self.dumps(value))
+
+    # JSON, not pickle: anyone writing in the shared server could run code here
+    @staticmethod
+    def dumps(value):
+        status, headers, body = value
+        return json.dumps({
+            'status': status,
+            'headers': headers,
+            'body': base64.b64encode(body).decode('ascii'),
+        })
+
+    @staticmethod
+    def loads(value):
+        value = json.loads(value)
+        headers = [(str(k), str(v)) for k, v in value['headers']]
+        return int(value['status']), headers, base64.b64decode(value['body'])
+
+    def get_versions(self, tags):
+        if not tags:
+            return []
+        versions = self.client.mget(["{}{}".format(TAG_PREFIX, t) for t in tags])
+        return [int(v) if v is not None else 0 for v in versions]
+
+    def invalidate(self, tags):
+        pipeline = self.client.pipeline()
+        for tag in tags:
+            pipeline.incr("{}{}".format(TAG_PREFIX, tag))
+        pipeline.execute()
+
+
+backends = {'memory': MemoryBackend, 'redis': RedisBackend}
+_backend = None
+
+
+def get_backend():
+    """ Created at first use, e.g. after the workers are forked """
+
+    global _backend
+    if _backend is None:
+        backend_class = backends.get(RESPONSE_CACHE_BACKEND)
+        if backend_class is None:
+            log.warning(
+                "Unknown response cache backend {}, using memory",
+                RESPONSE_CACHE_BACKEND,
+            )
+            backend_class = MemoryBackend
+        _backend = backend_class()
+    return _backend
+
+
+def get_cache_key(request, tags, versions, user=None, headers=()):
+    """ headers: other request headers the response depends on """
+
+    parts = [
+        request.method,
+        request.path,
+        # latin-1 maps every byte, query strings are not always valid utf-8
+        request.query_string.decode('latin-1'),
+        # responses are negotiated on Accept
+        request.headers.get('Accept', ''),
+        ','.join("{}={}".format(t, v) for t, v in zip(tags, versions)),
+    ]
+    parts.extend(request.headers.get(header, '') for header in headers)
+    if user is not None:
+        parts.append(user)
+
+    digest = hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+    return "{}{}".format(KEY_PREFIX, digest)
+
+
+def dump_response(response):
+    return (response.status_code, list(response.headers.items()), response.get_data())
+
+
+def load_response(value):
+    from flask import Response
+
+    status, headers, body = value
+    return Response(body, status=status, headers=headers)
+
+
+def invalidate(tags):
+    try:
+        get_backend().invalidate(tags)
+    except Exception as e:
+        log.warning("Unable to invalidate cache tags {}: {}", tags, e)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+Always-on statistical profiler, enabled by CONTINUOUS_PROFILER=1.
+
+A SIGPROF interval timer samples the stacks of all the threads serving a
+request and aggregates them per route. The sampling interval is doubled
+whenever the time spent in the handler exceeds PROFILER_OVERHEAD_BUDGET
+(fraction of the elapsed time) and restored when back below it.
+Requests slower than SLOW_REQUEST_THRESHOLD seconds are saved with all
+their samples as collapsed stacks, in the profiles ring buffer.
+
+Every process saves its aggregated stacks in CACHE_PATH (stacks-<pid>.json),
+they are merged when read from the admin endpoint.
+
+Signal handlers can only be installed by the main thread, and signals are
+always delivered to it: when the server is started by another thread the
+profiler is not enabled. With threaded workers the timer counts the CPU time
+of the whole process and every tick samples all the threads serving a
+request: a request waiting on I/O can be charged with samples caused by
+the CPU used by another one, i.e. its stack attributed to the wrong route.
+Prefer processes to threads when the per-route stacks have to be accurate.
+"""
+
+import os
+import sys
+import json
+import glob
+import signal
+import threading
+from collections import Counter
+from timeit import default_timer as timer
+
+from restapi.utilities.cache import get_cache_file, save_cache_file
+from restapi.utilities.profiler import format_frame, save_profile
+from restapi.utilities.logs import log
+
+CONTINUOUS_PROFILER = os.environ.get('CONTINUOUS_PROFILER', '0') == '1'
+PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.01))
+PROFILER_MAX_INTERVAL = 1.0
+PROFILER_OVERHEAD_BUDGET = float(os.environ.get('PROFILER_OVERHEAD_BUDGET', 0.01))
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 1.0))
+# Bounds on memory: distinct stacks per route and samples per request
+MAX_STACKS_PER_ROUTE = 500
+MAX_REQUEST_SAMPLES = 2000
+# Seconds between two checks of the overhead and two saves of the stacks
+SAMPLER_CHECK_INTERVAL = 5.0
+OTHER_STACKS = '[other]'
+
+
+def get_folded_stack(frame):
+    stack = []
+    while frame is not None:
+        stack.append(format_frame(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+class ActiveRequest:
+    def __init__(self, route, name):
+        self.route = route
+        self.name = name
+        self.start = timer()
+        self.samples = Counter()
+        self.total = 0
+
+
+class ContinuousSampler:
+    def __init__(self):
+        self.started = False
+        self.reset()
+
+    def reset(self):
+        # thread id -> ActiveRequest
+        self.active = {}
+        # route -> Counter of folded stacks
+        self.stacks = {}
+        self.interval = PROFILER_INTERVAL
+        self.spent = 0.0
+        self.window_start = timer()
+        self.last_save = timer()
+
+    def start(self):
+
+        if self.started:
+            return
+        if threading.current_thread() is not threading.main_thread():
+            # signal.signal would raise a ValueError
+            log.warning(
+                "Continuous profiler disabled, only the main thread can start it"
+            )
+            return
+
+        signal.signal(signal.SIGPROF, self.handler)
+        self.arm()
+        self.started = True
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.post_fork)
+
+        # uWSGI forks its workers from C, python hooks are not executed
+        try:
+            from uwsgidecorators import postfork
+        except ImportError:
+            pass
+        else:
+            postfork(self.post_fork)
+
+        log.info("Continuous profiler enabled, interval {}s", self.interval)
+
+    def arm(self):
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def post_fork(self):
+        # interval timers are not inherited by the child, signal handlers are
+        self.reset()
+        self.arm()
+
+    def begin_request(self, route, name):
+        self.active[threading.get_ident()] = ActiveRequest(route, name)
+
+    def end_request(self):
+
+        request = self.active.pop(threading.get_ident(), None)
+        if request is None:
+            return
+
+        duration = timer() - request.start
+        if duration >= SLOW_REQUEST_THRESHOLD and request.samples:
+            content = ''.join(
+                "{} {}\n".format(stack, count)
+                for stack, count in request.samples.items()
+            )
+            save_profile("slow.{}".format(request.name), 'sampling', content.encode())
+
+        if timer() - self.last_save >= SAMPLER_CHECK_INTERVAL:
+            self.save()
+
+    def handler(self, signum, frame):
+
+        start = timer()
+
+        frames = sys._current_frames()
+        main_thread = threading.main_thread().ident
+        for thread_id, request in list(self.active.items()):
+            # the main thread is executing this handler, skip its frame
+            thread_frame = frame if thread_id == main_thread else frames.get(thread_id)
+            if thread_frame is None:
+                continue
+
+            stack = get_folded_stack(thread_frame)
+            if request.total < MAX_REQUEST_SAMPLES:
+                request.samples[stack] += 1
+                request.total += 1
+
+            stacks = self.stacks.setdefault(request.route, Counter())
+            if stack not in stacks and len(stacks) >= MAX_STACKS_PER_ROUTE:
+                stack = OTHER_STACKS
+            stacks[stack] += 1
+
+        now = timer()
+        self.spent += now - start
+        elapsed = now - self.window_start
+        if elapsed >= SAMPLER_CHECK_INTERVAL:
+            self.check_overhead(self.spent / elapsed)
+            self.spent = 0.0
+            self.window_start = now
+
+    def check_overhead(self, overhead):
+
+        if overhead > PROFILER_OVERHEAD_BUDGET:
+            interval = min(self.interval * 2, PROFILER_MAX_INTERVAL)
+        elif overhead < PROFILER_OVERHEAD_BUDGET / 4:
+            interval = max(self.interval / 2, PROFILER_INTERVAL)
+        else:
+            return
+
+        if interval != self.interval:
+            self.interval = interval
+            self.arm()
+
+    @staticmethod
+    def get_filename(pid=None):
+        return "stacks-{}.json".format(pid or os.getpid())
+
+    def save(self):
+        self.last_save = timer()
+        if not self.stacks:
+            return
+        content = json.dumps(
+            {route: dict(stacks) for route, stacks in list(self.stacks.items())}
+        )
+        save_cache_file(self.get_filename(), content)
+
+    @staticmethod
+    def clear():
+        """ Remove the stacks saved by a previous boot """
+        for path in glob.glob(get_cache_file(ContinuousSampler.get_filename('*'))):
+            try:
+                os.remove(path)
+            except OSError as e:
+                log.warning("Unable to remove {}: {}", path, e)
+
+    def collect(self, top=20):
+        """ Most frequent stacks per route, merged over all the workers """
+
+        self.save()
+
+        routes = {}
+        for path in glob.glob(get_cache_file(self.get_filename('*'))):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning("Unable to read {}: {}", path, e)
+                continue
+
+            for route, stacks in data.items():
+                routes.setdefault(route, Counter()).update(stacks)
+
+        return {
+            route: {
+                'samples': sum(stacks.values()),
+                'stacks': stacks.most_common(top),
+            }
+            for route, stacks in routes.items()
+        }
+
+
+sampler = ContinuousSampler()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""
+Request coalescing: concurrent calls with the same key wait for the call
+already in flight and share its result (or its exception), instead of
+hitting the backends once each.
+Calls are only coalesced within a process (threads of the same worker).
+"""
+
+import os
+import threading
+from functools import wraps
+
+from restapi.exceptions import SingleFlightTimeout
+from restapi.utilities.logs import log
+
+SINGLEFLIGHT_TIMEOUT = float(os.environ.get('SINGLEFLIGHT_TIMEOUT', 30))
+
+
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, timeout, func, *args, **kwargs):
+        """
+        Execute func, unless a call with the same key is in flight:
+        in this case wait for it (up to timeout seconds) and return its result
+        or raise its exception
+        """
+
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise SingleFlightTimeout(key)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+            if call.waiters:
+                log.verbose("{} calls coalesced on {}", call.waiters, key)
+
+
+group = SingleFlight()
+
+
+def singleflight(key=None, timeout=SINGLEFLIGHT_TIMEOUT):
+    """
+    Coalesce concurrent calls of the decorated function (e.g. connector
+    client calls). key is a function of the call arguments, by default
+    the function name and the repr of its arguments
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if key is None:
+                call_key = "{}:{!r}:{!r}".format(
+                    func.__qualname__, args, sorted(kwargs.items())
+                )
+            else:
+                call_key = "{}:{}".format(func.__qualname__, key(*args, **kwargs))
+            return group.do(call_key, timeout, func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
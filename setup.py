@@ -71,6 +71,8 @@ setup(
         "loguru",
         "glom",
         "psutil",
+        "orjson",
+        "msgpack",
         "plumbum",
         "maxminddb-geolite2",
 
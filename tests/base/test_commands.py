@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the restapi command line, without executing the servers
+"""
+
+import os
+
+from click.testing import CliRunner
+
+from restapi import __commands__ as commands
+
+
+def fake_execvp(monkeypatch):
+    executed = []
+    monkeypatch.setattr(os, 'execvp', lambda file, args: executed.append(args))
+    monkeypatch.setenv('FLASK_PORT', '8080')
+    return executed
+
+
+def get_option(args, name):
+    return args[args.index(name) + 1]
+
+
+def test_production_server(monkeypatch):
+
+    executed = fake_execvp(monkeypatch)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 3)
+
+    commands.production_server()
+    args = executed.pop()
+    assert args[0] == 'uwsgi'
+    assert get_option(args, '--http-socket') == '0.0.0.0:8080'
+    assert get_option(args, '--module') == 'restapi.__main__:app'
+    assert get_option(args, '--processes') == '3'
+    # the app is loaded by the master and forked, unless recycled
+    assert '--master' in args
+    assert '--lazy-apps' not in args
+    assert '--max-requests' not in args
+
+    commands.production_server(workers=2, max_requests=100)
+    args = executed.pop()
+    assert get_option(args, '--processes') == '2'
+    assert get_option(args, '--max-requests') == '100'
+
+
+def test_launch_production(monkeypatch):
+
+    executed = fake_execvp(monkeypatch)
+    monkeypatch.setattr(commands, 'mywait', lambda: None)
+    monkeypatch.setattr(commands, 'starting_up', lambda: False)
+    runner = CliRunner()
+
+    result = runner.invoke(
+        commands.cli,
+        ['launch', '--production', '--workers', '4', '--max-requests', '10'],
+    )
+    assert result.exit_code == 0, result.output
+    assert len(executed) == 1
+    assert get_option(executed[0], '--processes') == '4'
+    assert get_option(executed[0], '--max-requests') == '10'
+
+    # not launched while the resources are still starting up
+    monkeypatch.setattr(commands, 'starting_up', lambda: True)
+    result = runner.invoke(commands.cli, ['launch', '--production'])
+    assert result.exit_code != 0
+    assert len(executed) == 1
+
+
+def test_stub_services(monkeypatch):
+
+    from restapi.connectors import Connector
+    from restapi.services.detect import detector
+
+    original = dict(detector.services_classes)
+    monkeypatch.setattr(detector, 'services_classes', dict(original))
+
+    # as in bench-startup --stub-services, before creating the app
+    commands.stub_services()
+
+    assert detector.services_classes.keys() == original.keys()
+    for name, stub in detector.services_classes.items():
+        ExtClass = original[name]
+        assert stub is not ExtClass
+        assert issubclass(stub, Connector)
+        assert stub.__name__ == ExtClass.__name__
+        assert stub.variables == getattr(ExtClass, 'variables', {})
+
+        # a connection never reaching the service
+        obj = stub().connect()
+        assert type(obj).__name__ == 'StubClient'
+
+
+def test_bench_startup(monkeypatch):
+
+    import subprocess
+
+    executed = []
+
+    def run(args, **kwargs):
+        executed.append(args[-1])
+        phases = '{"imports": [0.5, null], "total": [1.5, 2048]}'
+        return subprocess.CompletedProcess(args, 0, stdout=phases)
+
+    monkeypatch.setattr(subprocess, 'run', run)
+    runner = CliRunner()
+
+    result = runner.invoke(
+        commands.cli, ['bench-startup', '--runs', '2', '--no-memory', '--stub-services']
+    )
+    assert result.exit_code == 0, result.output
+    # every run boots a new process with stand-in connectors
+    assert executed == [
+        'from restapi.__commands__ import startup_phases; startup_phases(False, True)'
+    ] * 2
+    assert 'total' in result.output
+
+    result = runner.invoke(commands.cli, ['bench-startup', '--runs', '1'])
+    assert executed[-1].endswith('startup_phases(True, False)')
+
+    result = runner.invoke(
+        commands.cli, ['bench-startup', '--runs', '1', '--max-seconds', '1']
+    )
+    assert result.exit_code != 0
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the compression of responses
+"""
+
+import gzip
+import zlib
+
+from flask import Flask, Response
+
+from restapi.rest import compression
+from restapi.resources import miscellaneous
+from restapi.resources.miscellaneous import SwaggerSpecifications
+
+DEFINITIONS = {'swagger': '2.0', 'paths': {}}
+
+
+def test_specs_variants(monkeypatch):
+
+    monkeypatch.setattr(miscellaneous, 'MAX_SPECS_VARIANTS', 2)
+    monkeypatch.setattr(miscellaneous, 'SPECS_CACHE', miscellaneous.OrderedDict())
+    get_specs = SwaggerSpecifications.get_serialized_specs
+
+    first = get_specs(DEFINITIONS, 'http', 'a')
+    _, body, compressed = first
+    # compressed only when requested
+    assert compressed == {}
+    gzipped = compression.compress_static(body, 'gzip', compressed)
+    assert gzip.decompress(gzipped) == body
+    assert compression.compress_static(body, 'gzip', compressed) is gzipped
+
+    get_specs(DEFINITIONS, 'http', 'b')
+    # a is the most recently used, b is dropped
+    assert get_specs(DEFINITIONS, 'http', 'a') is first
+    get_specs(DEFINITIONS, 'http', 'c')
+    assert list(miscellaneous.SPECS_CACHE) == [
+        (id(DEFINITIONS), 'http', 'a'),
+        (id(DEFINITIONS), 'http', 'c'),
+    ]
+
+
+def test_compress_stream():
+
+    chunks = [b'first row\n', b'', b'second row\n']
+    pieces = list(compression.compress_stream(iter(chunks), 'gzip'))
+    # one piece per non-empty chunk, flushed to be sent at once, then the trailer
+    assert len(pieces) == 3
+    assert gzip.decompress(b''.join(pieces)) == b''.join(chunks)
+
+    # the first chunk can be decoded before the end of the stream
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decoder.decompress(pieces[0]) == b'first row\n'
+
+
+def test_compress_response(monkeypatch):
+
+    monkeypatch.setattr(compression, 'COMPRESSION_ENABLE', True)
+    monkeypatch.setattr(compression, 'COMPRESSION_MIN_SIZE', 10)
+    app = Flask(__name__)
+    body = b'x' * 100
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}) as ctx:
+        response = Response(body)
+        response.set_etag('abc')
+        response = compression.compress_response(ctx.request, response)
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.vary
+        assert gzip.decompress(response.get_data()) == body
+        assert response.get_etag() == ('abc', True)
+
+        # too small
+        response = compression.compress_response(ctx.request, Response(b'x'))
+        assert 'Content-Encoding' not in response.headers
+
+        # already compressed
+        response = Response(body, mimetype='image/png')
+        response = compression.compress_response(ctx.request, response)
+        assert 'Content-Encoding' not in response.headers
+
+        # streamed
+        response = Response(iter([body, body]))
+        response = compression.compress_response(ctx.request, response)
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(b''.join(response.response)) == body * 2
+
+    with app.test_request_context() as ctx:
+        response = compression.compress_response(ctx.request, Response(body))
+        assert 'Content-Encoding' not in response.headers
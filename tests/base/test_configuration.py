@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the configuration files and their cache
+"""
+
+import os
+from datetime import date
+
+import pytest
+
+from restapi.utilities import cache
+from restapi.utilities.configuration import read_configuration, load_yaml_file
+from restapi.utilities.configuration import get_configuration_snapshot
+from restapi.utilities.configuration import PROJECTS_DEFAULTS_FILE
+from restapi.utilities.configuration import PROJECT_CONF_FILENAME
+
+PROJECT = """
+project:
+  title: Test
+  description: Test project
+  version: '1.0'
+  rapydo: '1.0'
+variables:
+  date: 2020-01-01
+"""
+
+DEFAULTS = """
+project:
+  title: Default
+tags:
+  base: Base tag
+"""
+
+
+@pytest.fixture
+def confs(tmp_path):
+    path = tmp_path / 'confs'
+    path.mkdir()
+    (path / PROJECT_CONF_FILENAME).write_text(PROJECT)
+    (path / PROJECTS_DEFAULTS_FILE).write_text(DEFAULTS)
+    return str(path)
+
+
+def test_read_configuration(confs, cache_path):
+
+    configuration, extended, extend_path = read_configuration(
+        confs, confs, confs, confs
+    )
+    assert configuration['project']['title'] == 'Test'
+    assert configuration['tags'] == {'base': 'Base tag'}
+    assert extended is None
+    assert extend_path is None
+
+    # yaml dates would not be loaded back from json, nothing is cached
+    assert configuration['variables']['date'] == date(2020, 1, 1)
+    assert not any(f.startswith('configuration-') for f in os.listdir(cache_path))
+
+
+def test_configuration_cache(confs, cache_path, tmp_path):
+
+    project = tmp_path / 'confs' / PROJECT_CONF_FILENAME
+    project.write_text(PROJECT.replace('2020-01-01', 'today'))
+
+    first = read_configuration(confs, confs, confs, confs)
+    cached = [f for f in os.listdir(cache_path) if f.startswith('configuration-')]
+    assert len(cached) == 1
+    assert read_configuration(confs, confs, confs, confs) == first
+
+    # a modified file invalidates the cache
+    project.write_text(PROJECT.replace('2020-01-01', 'tomorrow'))
+    os.utime(project, ns=(0, 0))
+    configuration, _, _ = read_configuration(confs, confs, confs, confs)
+    assert configuration['variables']['date'] == 'tomorrow'
+
+
+def test_yaml_cache_not_trusted(confs, cache_path):
+
+    load_yaml_file(PROJECTS_DEFAULTS_FILE, confs)
+    cached = [f for f in os.listdir(cache_path) if f.startswith('yaml-')]
+    assert len(cached) == 1
+
+    # content planted in a folder writable by others is never read
+    (cache_path / cached[0]).write_text('{"planted": true}')
+    assert load_yaml_file(PROJECTS_DEFAULTS_FILE, confs) == {'planted': True}
+    os.chmod(cache_path, 0o777)
+    assert not cache.is_cache_path_safe()
+    assert load_yaml_file(PROJECTS_DEFAULTS_FILE, confs)['tags'] == {
+        'base': 'Base tag'
+    }
+
+
+def test_configuration_snapshot():
+
+    configuration = {
+        'project': {'title': 'Test', 'version': '1.0'},
+        'tags': ['a', {'b': 1}],
+    }
+    snapshot = get_configuration_snapshot(configuration)
+
+    assert snapshot['project.version'] == '1.0'
+    assert snapshot['project']['title'] == 'Test'
+    assert snapshot['tags'] == ('a', {'b': 1})
+    assert 'tags.b' not in snapshot
+
+    # read-only, and not affected by changes of the original configuration
+    with pytest.raises(TypeError):
+        snapshot['project.version'] = '2.0'
+    with pytest.raises(TypeError):
+        snapshot['project']['version'] = '2.0'
+    with pytest.raises(TypeError):
+        snapshot['tags'][1]['b'] = 2
+    configuration['project']['version'] = '2.0'
+    assert snapshot['project.version'] == '1.0'
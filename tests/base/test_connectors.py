@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the connectors life cycle, with a fake service
+"""
+
+from restapi.connectors import Connector
+
+
+class FakeClient:
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+
+
+class FakeConnector(Connector):
+
+    variables = {}
+
+    def __init__(self, *args, **kwargs):
+        self.connections = 0
+        super().__init__(*args, **kwargs)
+
+    def custom_connection(self, **kwargs):
+        self.connections += 1
+        return FakeClient(self.connections)
+
+    def is_connected(self, obj):
+        return obj.alive
+
+
+class ReusableConnector(FakeConnector):
+    def rebuild_connection(self, obj):
+        obj.rebuilt = True
+        return obj
+
+
+def test_post_fork_drops_stale_objects():
+
+    connector = FakeConnector()
+    connector.set_object(connector.get_instance(), key='k1')
+    assert connector.connections == 1
+
+    connector.post_fork()
+
+    # nothing is done at fork time, reconnected at next use
+    assert connector.connections == 1
+    assert connector.get_object(key='k1') is None
+    assert connector.get_instance().number == 2
+
+
+def test_post_fork_rebuild_in_place():
+
+    connector = ReusableConnector()
+    obj = connector.set_object(connector.get_instance(), key='k1')
+    connector.post_fork()
+
+    assert connector.connections == 1
+    assert connector.get_object(key='k1') is obj
+    assert obj.rebuilt
+
+
+class BrokenConnector(FakeConnector):
+    def set_connection_exception(self):
+        return ConnectionError
+
+    def custom_connection(self, **kwargs):
+        if self.connections > 0:
+            self.connections += 1
+            raise ConnectionError("unavailable")
+        return super().custom_connection(**kwargs)
+
+
+def test_check_connections_replaces_dead_objects():
+
+    connector = FakeConnector()
+    alive = connector.set_object(connector.connect(), key='k1')
+    dead = connector.set_object(connector.connect(), key='k2')
+    dead.alive = False
+
+    connector.check_connections()
+
+    assert connector.get_object(key='k1') is alive
+    assert connector.get_object(key='k2').number == 3
+    assert connector.connections == 3
+
+
+def test_check_connections_keeps_objects_if_unable_to_reconnect(monkeypatch):
+
+    connector = BrokenConnector()
+    obj = connector.set_object(connector.connect(), key='k1')
+    obj.alive = False
+
+    def retry(*args, **kwargs):
+        raise AssertionError("retry exits when the service is unavailable")
+
+    monkeypatch.setattr(connector, 'retry', retry)
+    connector.check_connections()
+
+    # a single attempt, retried at the next check
+    assert connector.connections == 2
+    assert connector.get_object(key='k1') is obj
+    connector.check_connections()
+    assert connector.connections == 3
+
+
+def test_required_services(monkeypatch):
+
+    from restapi.services.detect import detector
+
+    monkeypatch.setattr(detector, 'authentication_service', 'sqlalchemy')
+    # e.g. CELERY_WORKER_SERVICES=authentication
+    assert detector.get_required_services(['authentication', 'celery']) == [
+        'authentication', 'celery', 'sqlalchemy'
+    ]
+    assert detector.get_required_services(['sqlalchemy', 'authentication']) == [
+        'sqlalchemy', 'authentication'
+    ]
+    assert detector.get_required_services(['celery']) == ['celery']
+
+    monkeypatch.setattr(detector, 'authentication_service', None)
+    assert detector.get_required_services(['authentication']) == ['authentication']
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the JSON encoders, expected to be compatible with flask.jsonify
+"""
+
+import json
+import uuid
+from datetime import date, datetime
+
+import pytest
+from flask import Flask, jsonify
+
+from restapi.rest import encoders
+
+CONTENT = {
+    'b': datetime(2020, 1, 2, 3, 4, 5),
+    'a': date(2020, 1, 2),
+    'c': {'z': 1, 'y': uuid.UUID(int=1)},
+}
+
+
+@pytest.mark.parametrize('name', sorted(encoders.encoders))
+def test_flask_compatible(name):
+
+    app = Flask(__name__)
+    with app.app_context():
+        expected = json.loads(jsonify(CONTENT).get_data())
+        encoded = encoders.encoders[name](CONTENT, sort_keys=True)
+        assert json.loads(encoded) == expected
+        assert expected['b'] == 'Thu, 02 Jan 2020 03:04:05 GMT'
+        # keys sorted as with JSON_SORT_KEYS
+        assert encoded.index(b'"a"') < encoded.index(b'"b"')
+        assert encoded.index(b'"y"') < encoded.index(b'"z"')
+        assert encoders.dumps(CONTENT) == encoded
+
+        app.config['JSON_SORT_KEYS'] = False
+        unsorted = encoders.dumps(CONTENT)
+        assert unsorted.index(b'"b"') < unsorted.index(b'"a"')
+
+
+@pytest.mark.parametrize('name', sorted(encoders.encoders))
+def test_iso_dates(name, monkeypatch):
+
+    monkeypatch.setattr(encoders, 'JSON_DATES', 'iso')
+    encoded = json.loads(encoders.encoders[name](CONTENT))
+    assert encoded['b'] == '2020-01-02T03:04:05'
+    assert encoded['a'] == '2020-01-02'
+
+
+def test_csv_rows():
+
+    rows = [
+        {'name': 'a', 'info': {'size': 1}, 'tags': ['x', 'y'], 'ok': True},
+        {'name': 'b,c', 'info': {'size': None}, 'extra': 'ignored'},
+    ]
+    pieces = list(encoders.csv_rows(iter(rows)))
+    # the header comes with the first row, then one piece per row
+    assert len(pieces) == 2
+    assert b''.join(pieces).decode('utf-8').splitlines() == [
+        'name,info.size,tags,ok',
+        'a,1,"[""x"",""y""]",true',
+        '"b,c",,,',
+    ]
+
+
+def test_xml_rows():
+
+    rows = [{'name': 'a<b', '1st': None}, [1, 2]]
+    document = b''.join(encoders.xml_rows(iter(rows)))
+    assert document == (
+        encoders.XML_DECLARATION + b'<data>'
+        b'<item><name>a&lt;b</name><_1st/></item>'
+        b'<item><item>1</item><item>2</item></item>'
+        b'</data>'
+    )
+
+    def meta(elements):
+        return {'elements': elements}
+
+    document = b''.join(encoders.xml_rows(iter(rows[:1]), meta=meta))
+    assert document.endswith(
+        b'</data><errors/></Response><Meta><elements>1</elements></Meta></response>'
+    )
+
+
+def test_streamed_headers_not_duplicated():
+
+    from restapi.rest.response import ResponseMaker
+
+    app = Flask(__name__)
+    with app.test_request_context(headers={'Accept': 'text/csv'}):
+        response = ResponseMaker.generate_response(
+            [{'a': 1}], 200, None, {'X-Test': '1'}, False, None
+        )
+        response = app.make_response(response)
+        assert response.headers.getlist('X-Test') == ['1']
+        assert response.mimetype == 'text/csv'
+        assert b''.join(response.response) == b'a\r\n1\r\n'
+
+
+@pytest.mark.parametrize(
+    'mimetype', [encoders.MSGPACK_MIMETYPE, encoders.CBOR_MIMETYPE]
+)
+def test_binary_input(mimetype):
+
+    from flask_restful import reqparse
+    from restapi.rest.definition import EndpointResource
+
+    if mimetype not in encoders.binary_formats:
+        pytest.skip('{} is not installed'.format(mimetype))
+    dumps_binary, _ = encoders.binary_formats[mimetype]
+    body = dumps_binary({'name': 'a', 'size': 1, 'tags': ['x']})
+
+    app = Flask(__name__)
+    with app.test_request_context(
+        method='POST', data=body, headers={'Content-Type': mimetype}
+    ) as ctx:
+        decoded = encoders.get_binary_input(ctx.request)
+        assert decoded == {'name': 'a', 'size': 1, 'tags': ['x']}
+        # cached, as with request.get_json
+        assert encoders.get_binary_input(ctx.request) is decoded
+
+        endpoint = EndpointResource.__new__(EndpointResource)
+        endpoint._parser = reqparse.RequestParser()
+        endpoint._json_args = {}
+        assert endpoint.get_input() == {'name': 'a', 'size': 1, 'tags': ['x']}
+
+    with app.test_request_context(method='POST', json={'a': 1}) as ctx:
+        assert encoders.get_binary_input(ctx.request) is None
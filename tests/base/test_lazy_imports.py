@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the dependencies loaded only when (and if) they are used
+"""
+
+import sys
+import json
+import subprocess
+
+from restapi.services.authentication import BaseAuthentication
+from restapi.tests import API_URI
+from restapi.utilities.globals import mem
+
+LAZY_MODULES = ['geolite2', 'maxminddb', 'flask_cors', 'neomodel']
+
+
+def test_server_imports():
+
+    # a new process: modules imported by other tests are not loaded
+    code = (
+        "import sys, json, restapi.server; "
+        "print(json.dumps([m for m in {} if m in sys.modules]))"
+    ).format(LAZY_MODULES)
+    output = subprocess.run(
+        [sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True
+    )
+    assert output.returncode == 0
+    loaded = json.loads(output.stdout.strip().splitlines()[-1])
+    # neomodel is imported by the neo4j connector, only if enabled
+    assert [m for m in loaded if m != 'neomodel'] == []
+
+
+def test_geo_reader(monkeypatch):
+
+    monkeypatch.setattr(mem, 'geo_reader', None, raising=False)
+
+    assert BaseAuthentication.localize_ip('8.8.8.8') == 'United States'
+    reader = mem.geo_reader
+    assert reader is not None
+    # opened once
+    assert BaseAuthentication.localize_ip('127.0.0.1') == 'Unknown'
+    assert mem.geo_reader is reader
+
+
+def test_cors(client):
+
+    # development mode
+    r = client.options(
+        '{}/status'.format(API_URI),
+        headers={
+            'Origin': 'http://localhost:4200',
+            'Access-Control-Request-Method': 'GET',
+        },
+    )
+    assert r.headers['Access-Control-Allow-Origin'] == 'http://localhost:4200'
+    assert 'GET' in r.headers['Access-Control-Allow-Methods']
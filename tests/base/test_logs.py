@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the access log and the JSON-lines log of the requests,
+both written by enqueued sinks
+"""
+
+import json
+
+from restapi import server
+from restapi.tests import API_URI
+from restapi.utilities.logs import log, is_access_log, is_request_metrics
+from restapi.utilities.logs import print_message_on_stderr
+
+
+def test_access_log(client):
+
+    messages = []
+    # as the access log sink: records are written by the thread of the queue
+    handler = log.add(messages.append, enqueue=True, filter=is_access_log)
+    try:
+        client.get('{}/status?password=secret&x=1'.format(API_URI))
+        # wait for the queue to be consumed
+        log.complete()
+    finally:
+        log.remove(handler)
+
+    assert len(messages) == 1
+    record = messages[0].record
+    assert record['extra']['access']
+    assert not print_message_on_stderr(record)
+    assert 'GET' in record['message']
+    assert 'password=****&x=1' in record['message']
+    assert 'secret' not in record['message']
+
+
+def test_requests_log(client, tmp_path, monkeypatch):
+
+    path = tmp_path / 'requests.log'
+    monkeypatch.setattr(server, 'REQUESTS_LOG_PATH', str(path))
+    handler = log.add(
+        str(path), serialize=True, enqueue=True, filter=is_request_metrics
+    )
+    try:
+        client.get('{}/status'.format(API_URI))
+        client.get('{}/missing'.format(API_URI))
+        log.complete()
+    finally:
+        log.remove(handler)
+
+    records = [json.loads(line)['record'] for line in path.read_text().splitlines()]
+    assert len(records) == 2
+    assert all(not print_message_on_stderr(r) for r in records)
+
+    status, missing = (r['extra'] for r in records)
+    assert status['method'] == 'GET'
+    assert status['route'] == '/api/status'
+    assert status['status'] == 200
+    assert status['duration_us'] > 0
+    assert status['bytes'] > 0
+    assert status['queries'] == 0
+    assert status['user_id'] is None
+
+    assert missing['route'] is None
+    assert missing['status'] == 404
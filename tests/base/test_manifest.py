@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the endpoints manifest and its invalidation
+"""
+
+import os
+
+import pytest
+
+from restapi.customization import Customizer
+from restapi.services.detect import detector
+
+pytestmark = pytest.mark.usefixtures('cache_path')
+
+
+def make_customizer(monkeypatch, apis_dir):
+
+    # only the endpoints discovery, without loading configuration and swagger
+    customizer = Customizer.__new__(Customizer)
+    customizer._testing = True
+    folders = [{'apis_dir': str(apis_dir), 'apis_module': 'custom.apis'}]
+    monkeypatch.setattr(customizer, 'get_endpoints_folders', lambda: folders)
+
+    discovered = []
+
+    def discover_endpoints(folder):
+        discovered.append(folder['apis_dir'])
+        return []
+
+    monkeypatch.setattr(customizer, 'discover_endpoints', discover_endpoints)
+    return customizer, discovered
+
+
+def test_sources(tmp_path):
+
+    (tmp_path / 'first.py').write_text('')
+    (tmp_path / 'notes.txt').write_text('')
+    os.utime(tmp_path / 'first.py', (1, 1))
+
+    assert Customizer.get_sources(str(tmp_path)) == {'first.py': 1}
+
+
+def test_manifest_invalidation(tmp_path, monkeypatch):
+
+    apis_dir = tmp_path / 'apis'
+    apis_dir.mkdir()
+    endpoint = apis_dir / 'endpoint.py'
+    endpoint.write_text('')
+    os.utime(endpoint, (1, 1))
+
+    monkeypatch.setattr(detector, 'available_services', {'neo4j': True})
+    customizer, discovered = make_customizer(monkeypatch, apis_dir)
+
+    customizer.find_endpoints()
+    assert len(discovered) == 1
+    # modules are not inspected again while the sources are unchanged
+    customizer.find_endpoints()
+    assert len(discovered) == 1
+
+    # a modified module
+    os.utime(endpoint, (2, 2))
+    customizer.find_endpoints()
+    assert len(discovered) == 2
+    customizer.find_endpoints()
+    assert len(discovered) == 2
+
+    # a new module
+    (apis_dir / 'other.py').write_text('')
+    customizer.find_endpoints()
+    assert len(discovered) == 3
+
+    # endpoints can depend on the enabled services
+    monkeypatch.setattr(detector, 'available_services', {'neo4j': False})
+    customizer.find_endpoints()
+    assert len(discovered) == 4
+    customizer.find_endpoints()
+    assert len(discovered) == 4
+
+
+def test_invalid_manifest(tmp_path, monkeypatch, cache_path):
+
+    customizer, discovered = make_customizer(monkeypatch, tmp_path)
+    customizer.find_endpoints()
+
+    manifest_file = customizer.get_manifest_file(customizer.get_endpoints_folders())
+    (cache_path / manifest_file).write_text('{not json')
+    assert customizer.read_manifest(manifest_file, {}) is None
+
+    customizer.find_endpoints()
+    assert len(discovered) == 2
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the metrics registry and its aggregation over the processes
+"""
+
+import os
+import json
+import time
+
+import psutil
+from flask import Flask, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from restapi.utilities import metrics as metrics_module
+from restapi.utilities.metrics import Metrics, RETIRED, is_allowed_request
+
+
+def get_dead_pid():
+    pid = 2 ** 22
+    while psutil.pid_exists(pid):
+        pid -= 1
+    return pid
+
+
+def test_render(cache_path):
+
+    metrics = Metrics()
+    metrics.inc('restapi_http_requests_total', (('method', 'GET'), ('status', 200)))
+    metrics.inc('restapi_http_requests_total', (('method', 'GET'), ('status', 200)))
+    metrics.add('restapi_http_requests_in_flight', value=3)
+    metrics.observe('restapi_http_request_duration_seconds', (('route', '/x'),), 0.2)
+
+    lines = metrics.render().splitlines()
+    assert '# TYPE restapi_http_requests_total counter' in lines
+    assert 'restapi_http_requests_total{method="GET",status="200"} 2' in lines
+    assert 'restapi_http_requests_in_flight 3' in lines
+    assert (
+        'restapi_http_request_duration_seconds_bucket{route="/x",le="0.1"} 0' in lines
+    )
+    assert (
+        'restapi_http_request_duration_seconds_bucket{route="/x",le="0.25"} 1' in lines
+    )
+    assert 'restapi_http_request_duration_seconds_count{route="/x"} 1' in lines
+
+
+def test_dead_processes_retired(cache_path):
+
+    metrics = Metrics()
+    metrics.inc('restapi_http_requests_total')
+    metrics.save(force=True)
+
+    dead = {
+        'counters': [['restapi_http_requests_total', [], 5]],
+        'gauges': [['restapi_http_requests_in_flight', [], 2]],
+        'histograms': [],
+    }
+    (cache_path / Metrics.get_filename(get_dead_pid())).write_text(json.dumps(dead))
+
+    counters, gauges, _ = metrics.collect()
+    assert counters[('restapi_http_requests_total', ())] == 6
+    # gauges of dead processes are discarded
+    assert gauges == {}
+    assert sorted(f for f in os.listdir(cache_path) if f.endswith('.json')) == [
+        Metrics.get_filename(), RETIRED
+    ]
+
+    # counters stay monotonic
+    counters, _, _ = metrics.collect()
+    assert counters[('restapi_http_requests_total', ())] == 6
+
+    # a new process reusing a pid does not overwrite the counters of the old one
+    (cache_path / Metrics.get_filename()).write_text(json.dumps(dead))
+    reused = Metrics()
+    reused.inc('restapi_http_requests_total')
+    counters, _, _ = reused.collect()
+    assert counters[('restapi_http_requests_total', ())] == 11
+
+
+def test_delayed_save(cache_path, monkeypatch):
+
+    monkeypatch.setattr(metrics_module, 'METRICS_SAVE_INTERVAL', 0.2)
+    path = cache_path / Metrics.get_filename()
+
+    def saved_requests():
+        data = json.loads(path.read_text())
+        return data['counters'][0][2]
+
+    metrics = Metrics()
+    metrics.inc('restapi_http_requests_total')
+    metrics.save(force=True)
+    assert saved_requests() == 1
+
+    # e.g. requests completed within the interval, then the worker is idle
+    metrics.inc('restapi_http_requests_total')
+    metrics.save()
+    metrics.inc('restapi_http_requests_total')
+    metrics.save()
+    assert saved_requests() == 1
+
+    deadline = time.monotonic() + 5
+    while saved_requests() != 3 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert saved_requests() == 3
+    assert metrics.pending_save is None
+
+
+def test_allowed_request():
+
+    app = Flask(__name__)
+    app.wsgi_app = ProxyFix(app.wsgi_app)
+    allowed = []
+
+    @app.route('/metrics')
+    def view():
+        allowed.append(is_allowed_request(request))
+        return ''
+
+    client = app.test_client()
+    client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'})
+    # the forwarded address is checked when coming from a proxy
+    client.get(
+        '/metrics',
+        environ_base={'REMOTE_ADDR': '127.0.0.1'},
+        headers={'X-Forwarded-For': '8.8.8.8'},
+    )
+    # a forwarded address is not trusted when sent by an external client
+    client.get(
+        '/metrics',
+        environ_base={'REMOTE_ADDR': '8.8.8.8'},
+        headers={'X-Forwarded-For': '127.0.0.1'},
+    )
+    assert allowed == [True, False, False]
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the on-demand profiler and its ring buffer of saved profiles
+"""
+
+import time
+import pstats
+
+import pytest
+from flask import Flask
+
+from restapi.utilities import profiler
+from restapi.utilities.profiler import get_profile_mode, run_profiled
+from restapi.utilities.profiler import list_profiles, read_profile, save_profile
+
+pytestmark = pytest.mark.usefixtures('cache_path')
+
+
+class FakeAuth:
+    def __init__(self, user=None, admin=False):
+        self.user = user
+        self.admin = admin
+
+    def get_user(self):
+        return self.user
+
+    def verify_admin(self):
+        return self.admin
+
+
+def profiled_function(n):
+    return sum(i * i for i in range(n))
+
+
+def test_profile_mode(monkeypatch):
+
+    app = Flask(__name__)
+    admin = FakeAuth(user='admin', admin=True)
+
+    with app.test_request_context(headers={'X-Profile': 'sampling'}):
+        assert get_profile_mode(admin) == 'sampling'
+        # the header of other users and of anonymous requests is ignored
+        assert get_profile_mode(FakeAuth(user='user')) is None
+        assert get_profile_mode(FakeAuth()) is None
+
+    with app.test_request_context(headers={'X-Profile': 'unknown'}):
+        assert get_profile_mode(admin) == profiler.PROFILE_MODE
+        assert get_profile_mode(admin, default='sampling') == 'sampling'
+
+    with app.test_request_context():
+        assert get_profile_mode(admin) is None
+        monkeypatch.setattr(profiler, 'PROFILE_SAMPLE_RATE', 1)
+        assert get_profile_mode(FakeAuth()) == profiler.PROFILE_MODE
+
+
+def test_cprofile(cache_path):
+
+    assert run_profiled('cprofile', 'test', profiled_function, 1000) == 332833500
+
+    profile_ids = list_profiles()
+    assert len(profile_ids) == 1
+    assert profile_ids[0].endswith('-test.prof')
+    assert read_profile(profile_ids[0]) is not None
+
+    stats = pstats.Stats(str(cache_path / 'profile-{}'.format(profile_ids[0])))
+    functions = [name for _, _, name in stats.stats]
+    assert 'profiled_function' in functions
+
+
+def test_sampling():
+
+    def slow():
+        # long enough to be sampled several times
+        deadline = time.monotonic() + 0.1
+        while time.monotonic() < deadline:
+            profiled_function(1000)
+
+    run_profiled('sampling', 'test', slow)
+    profile_ids = list_profiles()
+    assert profile_ids[0].endswith('-test.folded')
+
+    lines = read_profile(profile_ids[0]).decode().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) > 0
+    assert 'test_profiler.py:slow' in stack.split(';')
+
+
+def test_ring_buffer(monkeypatch):
+
+    monkeypatch.setattr(profiler, 'PROFILES_BUFFER_SIZE', 3)
+
+    for name in ('first', 'second', 'third', 'fourth', 'fifth'):
+        save_profile(name, 'cprofile', b'')
+
+    # the oldest profiles are removed
+    names = [profile_id.split('-', 2)[2] for profile_id in list_profiles()]
+    assert names == ['fifth.prof', 'fourth.prof', 'third.prof']
+
+    assert read_profile('../../etc/passwd') is None
+    assert read_profile('1-2-missing.prof') is None
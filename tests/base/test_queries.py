@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the queries counted while serving a request and their budget
+"""
+
+import pytest
+from flask import Flask
+
+from restapi.tests import BaseTests
+from restapi.utilities import queries
+from restapi.utilities.queries import count_query, add_query_headers
+
+
+def make_app(statements):
+
+    app = Flask(__name__)
+    app.after_request(add_query_headers)
+
+    @app.route('/api/test', methods=['GET', 'POST'])
+    def view():
+        for service, statement in statements:
+            count_query(service, statement)
+        return ''
+
+    return app
+
+
+def test_query_headers(monkeypatch):
+
+    monkeypatch.setattr(queries, 'QUERY_REPEAT_THRESHOLD', 2)
+
+    client = make_app([]).test_client()
+    response = client.get('/api/test')
+    assert response.headers['X-Query-Count'] == '0'
+    assert 'X-Query-Count-Details' not in response.headers
+    assert 'X-Query-Repeated' not in response.headers
+
+    statements = [('sqlalchemy', 'SELECT user')]
+    statements += [('sqlalchemy', 'SELECT role')] * 2
+    statements += [('neo4j', 'MATCH (n)')] * 3
+    client = make_app(statements).test_client()
+    response = client.get('/api/test')
+    assert response.headers['X-Query-Count'] == '6'
+    assert response.headers['X-Query-Count-Details'] == 'sqlalchemy=3, neo4j=3'
+    # only the neo4j query is repeated more than the threshold
+    assert response.headers['X-Query-Repeated'] == '3'
+
+    # queries outside of a request are ignored, without errors
+    count_query('sqlalchemy', 'SELECT user')
+
+
+def test_query_budget():
+
+    client = make_app([('sqlalchemy', 'SELECT user')] * 3).test_client()
+    tests = BaseTests()
+
+    tests._test_endpoint(client, 'test', get_status=200, query_budget=3)
+    tests._test_endpoint(
+        client, 'test', get_status=200, post_status=200, query_budget={'get': 3}
+    )
+
+    with pytest.raises(pytest.fail.Exception, match='executed 3 queries, budget is 2'):
+        tests._test_endpoint(client, 'test', get_status=200, query_budget=2)
+    with pytest.raises(pytest.fail.Exception, match='POST'):
+        tests._test_endpoint(
+            client, 'test', post_status=200, query_budget={'get': 3, 'post': 1}
+        )
+
+    # N+1 patterns fail within the budget too
+    client = make_app([('sqlalchemy', 'SELECT user')] * 6).test_client()
+    with pytest.raises(pytest.fail.Exception, match='possible N\\+1'):
+        tests._test_endpoint(client, 'test', get_status=200, query_budget=10)
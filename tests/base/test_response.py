@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the streamed and conditional responses
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask, Response
+from werkzeug.http import http_date
+
+from restapi.rest import response
+from restapi.rest.compression import compress_response
+from restapi.rest.definition import EndpointResource
+from restapi.rest.encoders import JSON_MIMETYPE, MSGPACK_MIMETYPE, CBOR_MIMETYPE
+from restapi.rest.encoders import binary_formats
+from restapi.rest.response import ResponseMaker, chunked
+
+MODIFIED = datetime(2020, 1, 2, 3, 4, 5)
+
+
+def test_chunked(monkeypatch):
+
+    monkeypatch.setattr(response, 'STREAM_CHUNK_SIZE', 4)
+    pieces = [b'first', b'a', b'bc', b'd', b'e', b'fghij', b'k']
+    # the first piece is sent immediately, then at least 4 bytes at a time
+    assert list(chunked(iter(pieces))) == [b'first', b'abcd', b'efghij', b'k']
+    assert list(chunked(iter([]))) == []
+
+
+def test_json_array_rows():
+
+    rows = [{'a': 1}, {'b': 2}]
+    body = b''.join(ResponseMaker.json_array_rows(iter(rows), 200, wrapped=False))
+    assert json.loads(body) == rows
+
+    body = b''.join(
+        ResponseMaker.json_array_rows(
+            iter(rows), 200, wrapped=True, custom_metas={'page': 1}
+        )
+    )
+    # same envelope of wrapped_response, Meta included
+    expected = ResponseMaker.wrapped_response(rows, 200, custom_metas={'page': 1})
+    assert json.loads(body) == expected
+
+    body = b''.join(ResponseMaker.json_array_rows(iter([]), 200, wrapped=True))
+    assert json.loads(body)['Meta']['elements'] == 0
+
+
+def test_custom_wrapper_not_streamed():
+
+    def wrapper(content, code, errors, custom_metas):
+        return {'items': content, 'total': len(content), 'extra': custom_metas}
+
+    app = Flask(__name__)
+    with app.test_request_context(headers={'Accept': 'application/json'}):
+        resp = ResponseMaker.stream_response(
+            iter([1, 2]), 200, {}, response_wrapper=wrapper, meta={'page': 1}
+        )
+        assert not resp.is_streamed
+        assert json.loads(resp.get_data()) == {
+            'items': [1, 2], 'total': 2, 'extra': {'page': 1}
+        }
+
+
+def make_endpoint():
+    # validators only, without services and parameters
+    endpoint = EndpointResource.__new__(EndpointResource)
+    endpoint._etag = None
+    endpoint._last_modified = None
+    return endpoint
+
+
+def conditional(app, body, method='GET', headers=None, **kwargs):
+    with app.test_request_context(method=method, headers=headers):
+        return ResponseMaker.make_conditional(Response(body), **kwargs)
+
+
+def test_body_etag():
+
+    app = Flask(__name__)
+    first = conditional(app, b'content')
+    etag, weak = first.get_etag()
+    assert not weak
+    assert first.status_code == 200
+
+    headers = {'If-None-Match': '"{}"'.format(etag)}
+    revalidated = conditional(app, b'content', headers=headers)
+    assert revalidated.status_code == 304
+    assert revalidated.get_etag() == (etag, False)
+
+    changed = conditional(app, b'changed', headers=headers)
+    assert changed.status_code == 200
+
+    # If-None-Match uses the weak comparison
+    weak_etag = 'W/"{}"'.format(etag)
+    assert conditional(
+        app, b'content', headers={'If-None-Match': weak_etag}
+    ).status_code == 304
+
+    # only GET and HEAD are conditional
+    for method in ('POST', 'PUT'):
+        response = conditional(app, b'content', method=method, headers=headers)
+        assert response.status_code == 200
+        assert response.get_etag() == (None, None)
+
+
+def test_gzip_weakened_etag(monkeypatch):
+
+    from restapi.rest import compression
+
+    monkeypatch.setattr(compression, 'COMPRESSION_ENABLE', True)
+    monkeypatch.setattr(compression, 'COMPRESSION_MIN_SIZE', 10)
+    app = Flask(__name__)
+    body = b'x' * 100
+
+    # as in the server: conditional first, then compressed in after_request
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}) as ctx:
+        first = ResponseMaker.make_conditional(Response(body))
+        first = compress_response(ctx.request, first)
+    etag, weak = first.get_etag()
+    assert weak
+    assert first.headers['ETag'] == 'W/"{}"'.format(etag)
+
+    # the weakened ETag sent back by the client still matches
+    headers = {'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']}
+    with app.test_request_context(headers=headers) as ctx:
+        revalidated = ResponseMaker.make_conditional(Response(body))
+        revalidated = compress_response(ctx.request, revalidated)
+    assert revalidated.status_code == 304
+    assert 'Content-Encoding' not in revalidated.headers
+
+
+def test_version_etag():
+
+    app = Flask(__name__)
+    etag = ResponseMaker.get_version_etag(42)
+    assert etag == ResponseMaker.get_version_etag('42')
+    assert etag != ResponseMaker.get_version_etag(43)
+
+    with app.test_request_context():
+        endpoint = make_endpoint()
+        assert endpoint.not_modified(version=42) is None
+        response = ResponseMaker.make_conditional(
+            Response(b'content'), etag=endpoint._etag, weak=True
+        )
+    assert response.get_etag() == (etag, True)
+
+    headers = {'If-None-Match': 'W/"{}"'.format(etag)}
+    with app.test_request_context(headers=headers):
+        not_modified = make_endpoint().not_modified(version=42)
+        assert not_modified.status_code == 304
+        assert not_modified.get_etag() == (etag, True)
+        # a new version
+        assert make_endpoint().not_modified(version=43) is None
+
+    with app.test_request_context(method='POST', headers=headers):
+        assert make_endpoint().not_modified(version=42) is None
+
+
+def test_last_modified():
+
+    app = Flask(__name__)
+    since = {'If-Modified-Since': http_date(MODIFIED)}
+
+    with app.test_request_context(headers=since):
+        # microseconds and timezones are ignored, as in HTTP dates
+        aware = MODIFIED.replace(microsecond=500, tzinfo=timezone.utc)
+        not_modified = make_endpoint().not_modified(last_modified=aware)
+        assert not_modified.status_code == 304
+        assert not_modified.last_modified == MODIFIED
+
+        later = MODIFIED + timedelta(seconds=1)
+        assert make_endpoint().not_modified(last_modified=later) is None
+
+        # the same with the validators added to the final response
+        response = ResponseMaker.make_conditional(
+            Response(b'content'), etag='v1', last_modified=MODIFIED
+        )
+        assert response.status_code == 304
+
+    # If-Modified-Since is ignored when If-None-Match does not match
+    headers = dict(since, **{'If-None-Match': '"other"'})
+    with app.test_request_context(headers=headers):
+        endpoint = make_endpoint()
+        assert endpoint.not_modified(version=1, last_modified=MODIFIED) is None
+
+    with app.test_request_context(method='PUT', headers=since):
+        assert make_endpoint().not_modified(last_modified=MODIFIED) is None
+
+
+def accepted(app, accept):
+    with app.test_request_context(headers={'Accept': accept}):
+        return ResponseMaker.get_accepted_formats()
+
+
+def test_accepted_formats():
+
+    app = Flask(__name__)
+    assert accepted(app, 'application/json, application/msgpack') == [
+        'application/json', 'application/msgpack'
+    ]
+    # by quality, then in the order of the client; q=0 is not acceptable
+    assert accepted(
+        app, 'text/csv;q=0.5, application/XML;charset=utf-8, */*;q=0.1, text/html;q=0'
+    ) == ['application/xml', 'text/csv', '*/*']
+    assert accepted(app, 'a/b;q=0.5, c/d;q=0.5;level=1') == ['a/b', 'c/d']
+    with app.test_request_context():
+        assert ResponseMaker.get_accepted_formats() == ['*/*']
+
+
+@pytest.mark.parametrize('mimetype', [MSGPACK_MIMETYPE, CBOR_MIMETYPE])
+def test_binary_responses(mimetype):
+
+    if mimetype not in binary_formats:
+        pytest.skip('{} is not installed'.format(mimetype))
+    _, loads = binary_formats[mimetype]
+    app = Flask(__name__)
+    content = {'name': 'a', 'size': 1, 'modified': MODIFIED}
+    decoded = {'name': 'a', 'size': 1, 'modified': 'Thu, 02 Jan 2020 03:04:05 GMT'}
+
+    # the client order and q-values are honoured
+    for accept, expected in (
+        ('application/json, {}'.format(mimetype), JSON_MIMETYPE),
+        ('{};q=0.5, application/json'.format(mimetype), JSON_MIMETYPE),
+        ('{}, application/json'.format(mimetype), mimetype),
+        ('application/json;q=0.5, {}'.format(mimetype), mimetype),
+    ):
+        with app.test_request_context(headers={'Accept': accept}):
+            resp = app.make_response(ResponseMaker.generate_response(
+                content, 200, None, {}, False, None
+            ))
+            assert resp.mimetype == expected
+            if expected == mimetype:
+                assert loads(resp.get_data()) == decoded
+
+    # streamed rows are a sequence of objects
+    rows = [{'a': 1}, {'b': [1, 2]}, {'c': None}]
+    with app.test_request_context(headers={'Accept': mimetype}):
+        resp = ResponseMaker.stream_response(iter(rows), 200, {})
+        assert resp.mimetype == mimetype
+        pieces = list(ResponseMaker.binary_rows(iter(rows), mimetype))
+        assert [loads(piece) for piece in pieces] == rows
+        assert resp.get_data() == b''.join(pieces)
+
+    with app.test_request_context(
+        headers={'Accept': 'application/json, {}'.format(mimetype)}
+    ):
+        resp = ResponseMaker.stream_response(iter(rows), 200, {})
+        assert resp.mimetype == JSON_MIMETYPE
+        assert json.loads(resp.get_data()) == rows
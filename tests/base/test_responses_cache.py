@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the cache of GET responses
+"""
+
+import pickle
+
+import pytest
+
+from restapi import decorators
+from restapi.utilities.responses_cache import MemoryBackend, RedisBackend
+
+# tag versions are saved in CACHE_PATH
+pytestmark = pytest.mark.usefixtures('cache_path')
+
+
+def test_memory_backend():
+
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', 1, ttl=60)
+    backend.set('b', 2, ttl=60)
+    assert backend.get('a') == 1
+    # least recently used entry is removed
+    backend.set('c', 3, ttl=60)
+    assert backend.get('b') is None
+    assert backend.get('a') == 1
+    # expired
+    backend.set('d', 4, ttl=-1)
+    assert backend.get('d') is None
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value.encode('utf-8') if isinstance(value, str) else value
+
+
+def test_redis_backend_values():
+
+    backend = RedisBackend.__new__(RedisBackend)
+    backend.client = FakeRedis()
+
+    response = (200, [('Content-Type', 'application/json'), ('ETag', '"x"')], b'\x00{}')
+    backend.set('k', response, ttl=60)
+    assert backend.get('k') == response
+    assert backend.get('missing') is None
+
+    # never unpickled
+    backend.client.values['k'] = pickle.dumps(response)
+    assert backend.get('k') is None
+
+
+def test_shared_tag_versions():
+
+    # e.g. two workers, each with its own entries
+    worker1 = MemoryBackend()
+    worker2 = MemoryBackend()
+
+    versions = worker1.get_versions(['users', 'groups'])
+    assert worker2.get_versions(['users', 'groups']) == versions
+
+    worker1.invalidate(['users'])
+    invalidated = worker2.get_versions(['users', 'groups'])
+    assert invalidated[0] != versions[0]
+    assert invalidated[1] == versions[1]
+    assert worker1.get_versions(['users', 'groups']) == invalidated
+
+
+def test_placed_above_auth_required():
+
+    with pytest.raises(AttributeError):
+
+        class Endpoint:
+            @decorators.cache(ttl=10)
+            @decorators.auth.required()
+            def get(self):
+                pass
@@ -36,11 +36,22 @@ class TestApp(BaseTests):
         output = self.get_content(r)
         assert output == alive_message
 
+        # Check conditional requests
+        r2 = client.get(endpoint, headers={'If-None-Match': r.headers['ETag']})
+        assert r2.status_code == hcodes.HTTP_NOT_MODIFIED
+        assert r2.data == b''
+        r2 = client.post(endpoint, headers={'If-None-Match': r.headers['ETag']})
+        assert r2.status_code != hcodes.HTTP_NOT_MODIFIED
+
         # Check failure
         log.info("*** VERIFY if invalid endpoint gives Not Found")
         r = client.get(API_URI)
         assert r.status_code == hcodes.HTTP_BAD_NOTFOUND
 
+        # Query strings are logged even if not valid utf-8
+        r = client.get(endpoint, query_string=b'password=\xff&x=\xe0')
+        assert r.status_code == hcodes.HTTP_OK_BASIC
+
         # Check HTML response to status if agent/request is text/html
         headers = {"Accept": 'text/html'}
         r = client.get(endpoint, headers=headers)
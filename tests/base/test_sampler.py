@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the continuous profiler, without arming its interval timer
+"""
+
+import sys
+import signal
+import threading
+
+import pytest
+
+from restapi.utilities import sampler as sampler_module
+from restapi.utilities.profiler import list_profiles, read_profile
+from restapi.utilities.sampler import ContinuousSampler, OTHER_STACKS
+
+pytestmark = pytest.mark.usefixtures('cache_path')
+
+
+# A tick of the timer, as if the signal was received in different functions
+def first(sampler):
+    sampler.handler(signal.SIGPROF, sys._getframe())
+
+
+def second(sampler):
+    sampler.handler(signal.SIGPROF, sys._getframe())
+
+
+def third(sampler):
+    sampler.handler(signal.SIGPROF, sys._getframe())
+
+
+def test_not_main_thread():
+
+    handler = signal.getsignal(signal.SIGPROF)
+    sampler = ContinuousSampler()
+    thread = threading.Thread(target=sampler.start)
+    thread.start()
+    thread.join()
+
+    assert not sampler.started
+    assert signal.getsignal(signal.SIGPROF) is handler
+
+
+def test_bounded_stacks(monkeypatch):
+
+    monkeypatch.setattr(sampler_module, 'MAX_STACKS_PER_ROUTE', 2)
+    monkeypatch.setattr(sampler_module, 'MAX_REQUEST_SAMPLES', 4)
+
+    sampler = ContinuousSampler()
+    sampler.begin_request('/api/test', 'test.get')
+    request = sampler.active[threading.get_ident()]
+    for tick in (first, second, third, third, first, second):
+        tick(sampler)
+
+    stacks = sampler.stacks['/api/test']
+    names = {
+        stack.rsplit(':', 1)[-1]: count
+        for stack, count in stacks.items() if stack != OTHER_STACKS
+    }
+    assert names == {'first': 2, 'second': 2}
+    # new stacks beyond the limit are counted together
+    assert stacks[OTHER_STACKS] == 2
+
+    # samples of a single request are limited too, without a catch-all
+    assert request.total == 4
+    assert sum(request.samples.values()) == 4
+    assert len(request.samples) == 3
+
+    # threads not serving a request are not sampled
+    sampler.end_request()
+    first(sampler)
+    assert sum(sampler.stacks['/api/test'].values()) == 6
+
+
+def test_slow_requests(monkeypatch):
+
+    sampler = ContinuousSampler()
+
+    monkeypatch.setattr(sampler_module, 'SLOW_REQUEST_THRESHOLD', 60)
+    sampler.begin_request('/api/test', 'test.get')
+    first(sampler)
+    sampler.end_request()
+    assert list_profiles() == []
+
+    monkeypatch.setattr(sampler_module, 'SLOW_REQUEST_THRESHOLD', 0)
+    # a request without samples is not saved
+    sampler.begin_request('/api/test', 'test.get')
+    sampler.end_request()
+    assert list_profiles() == []
+
+    sampler.begin_request('/api/test', 'test.get')
+    first(sampler)
+    first(sampler)
+    second(sampler)
+    sampler.end_request()
+
+    profile_ids = list_profiles()
+    assert len(profile_ids) == 1
+    assert profile_ids[0].endswith('-slow.test.get.folded')
+    lines = read_profile(profile_ids[0]).decode().splitlines()
+    counts = {
+        stack.rsplit(':', 1)[-1]: int(count)
+        for stack, count in (line.rsplit(' ', 1) for line in lines)
+    }
+    assert counts == {'first': 2, 'second': 1}
+
+
+def test_overhead(monkeypatch):
+
+    sampler = ContinuousSampler()
+    monkeypatch.setattr(sampler, 'arm', lambda: None)
+    base = sampler.interval
+
+    sampler.check_overhead(sampler_module.PROFILER_OVERHEAD_BUDGET * 2)
+    assert sampler.interval == base * 2
+    sampler.check_overhead(sampler_module.PROFILER_OVERHEAD_BUDGET / 2)
+    assert sampler.interval == base * 2
+    sampler.check_overhead(0)
+    assert sampler.interval == base
+    # never below the configured interval
+    sampler.check_overhead(0)
+    assert sampler.interval == base
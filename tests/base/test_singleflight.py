@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for request coalescing
+"""
+
+import time
+import threading
+
+import pytest
+from flask import Flask
+
+from restapi import decorators
+from restapi.exceptions import SingleFlightTimeout
+from restapi.utilities import responses_cache
+from restapi.utilities.singleflight import SingleFlight
+
+
+def run_concurrently(flight, key, func, callers, timeout=5):
+    """ Start the leader, then the waiters while func is still running """
+
+    results = [None] * callers
+    errors = [None] * callers
+
+    def call(i):
+        try:
+            results[i] = flight.do(key, timeout, func)
+        except BaseException as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+def test_coalesced_calls():
+
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    executions = []
+
+    def func():
+        executions.append(1)
+        started.set()
+        release.wait(5)
+        return 'result'
+
+    threads, results, errors = run_concurrently(flight, 'key', func, 1)
+    started.wait(5)
+    waiters, w_results, w_errors = run_concurrently(flight, 'key', func, 3)
+    # waiters are registered before the leader is released
+    while flight.calls['key'].waiters < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in threads + waiters:
+        t.join()
+
+    assert len(executions) == 1
+    assert results + w_results == ['result'] * 4
+    assert errors + w_errors == [None] * 4
+    assert flight.calls == {}
+
+    # once completed, the next call is executed again
+    assert flight.do('key', 5, lambda: 'next') == 'next'
+
+
+def test_shared_exception():
+
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def func():
+        started.set()
+        release.wait(5)
+        raise ValueError('failed')
+
+    threads, _, errors = run_concurrently(flight, 'key', func, 1)
+    started.wait(5)
+    waiters, _, w_errors = run_concurrently(flight, 'key', func, 2)
+    while flight.calls['key'].waiters < 2:
+        time.sleep(0.001)
+    release.set()
+    for t in threads + waiters:
+        t.join()
+
+    assert all(isinstance(e, ValueError) for e in errors + w_errors)
+
+
+def test_timeout():
+
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def func():
+        started.set()
+        release.wait(5)
+        return 'late'
+
+    threads, results, _ = run_concurrently(flight, 'key', func, 1)
+    started.wait(5)
+    with pytest.raises(SingleFlightTimeout):
+        flight.do('key', 0.01, func)
+    # different keys are never coalesced
+    assert flight.do('other', 0.01, lambda: 'other') == 'other'
+
+    release.set()
+    threads[0].join()
+    assert results == ['late']
+
+
+def test_conditional_requests_not_coalesced():
+
+    app = Flask(__name__)
+    with app.test_request_context('/api/x?a=1'):
+        from flask import request
+
+        key = responses_cache.get_cache_key(
+            request, [], [], 'user', headers=responses_cache.CONDITIONAL_HEADERS
+        )
+    with app.test_request_context('/api/x?a=1', headers={'If-None-Match': '"v1"'}):
+        conditional = responses_cache.get_cache_key(
+            request, [], [], 'user', headers=responses_cache.CONDITIONAL_HEADERS
+        )
+    with app.test_request_context('/api/x?a=%FF'):
+        # not valid utf-8
+        invalid = responses_cache.get_cache_key(request, [], [], 'user')
+
+    assert key != conditional
+    assert invalid != key
+
+
+def test_placed_above_auth_required():
+
+    with pytest.raises(AttributeError):
+
+        class Endpoint:
+            @decorators.singleflight()
+            @decorators.catch_errors()
+            @decorators.auth.required()
+            def get(self):
+                pass
+
+    class Endpoint:
+        @decorators.catch_errors()
+        @decorators.auth.required()
+        @decorators.singleflight()
+        def get(self):
+            pass
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the swagger validation and its cache
+"""
+
+import os
+
+from restapi.swagger import Swagger
+
+SPEC = {
+    'swagger': '2.0',
+    'info': {'title': 'Test', 'version': '1.0'},
+    'paths': {'/api/test': {'get': {'responses': {'200': {'description': 'ok'}}}}},
+}
+
+
+class FakeCustomizer:
+    _validated_spec = None
+
+
+def test_validation_cache(cache_path):
+
+    customizer = FakeCustomizer()
+    swagger = Swagger([], customizer)
+
+    assert swagger.validation(SPEC)
+    assert customizer._validated_spec is not None
+    markers = os.listdir(cache_path)
+    assert len(markers) == 1
+    # the spec is not cached, only the result of the validation
+    assert (cache_path / markers[0]).read_text() == ''
+
+    invalid = dict(SPEC, paths={'/api/test': {'get': {}}})
+    assert not swagger.validation(invalid)
+    # the marker of the valid spec does not skip the validation of others
+    assert os.listdir(cache_path) == markers
+
+    customizer._validated_spec = None
+    assert swagger.validation(SPEC)
+    assert customizer._validated_spec is not None
@@ -1,8 +1,21 @@
 import pytest
 from restapi.server import create_app
+from restapi.utilities import cache
+from restapi.utilities.metrics import metrics
 
 
 @pytest.fixture
 def app():
     app = create_app(testing_mode=True)
     return app
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    """ An empty CACHE_PATH, only used by the current test """
+
+    # metrics of the requests made by previous tests are not saved in here
+    metrics.flush()
+    path = tmp_path / 'cache'
+    monkeypatch.setattr(cache, 'CACHE_PATH', str(path))
+    return path